@@ -0,0 +1,247 @@
+# Writes synthetic .cn6, .na2, .nb2 and .br2 files for benchmarking the import and export scripts.
+#
+# The assets are deterministic for a given set of options: a skeleton of random bones below a world
+# bone, grid meshes with random bone influences and a random animation of every bone.
+#
+#   python generate_assets.py --out assets --bones 120 --meshes 4 --verts 20000 --influences 4 --frames 60
+
+import os
+import math
+import argparse
+import numpy as np
+
+# converts (N, 4) x,y,z,w quaternions into (N, 3, 3) row-vector rotation matrices
+def quaternionsToMatrices(quaternions):
+	x, y, z, w = quaternions.T
+	matrices = np.empty((len(quaternions), 3, 3))
+	matrices[:, 0] = np.stack([1 - 2 * (y * y + z * z), 2 * (x * y + w * z), 2 * (x * z - w * y)], axis=1)
+	matrices[:, 1] = np.stack([2 * (x * y - w * z), 1 - 2 * (x * x + z * z), 2 * (y * z + w * x)], axis=1)
+	matrices[:, 2] = np.stack([2 * (x * z + w * y), 2 * (y * z - w * x), 1 - 2 * (x * x + y * y)], axis=1)
+	return matrices
+
+# returns random unit x,y,z,w quaternions, near the identity for a small spread
+def randomQuaternions(rng, count, spread=0.3):
+	quaternions = np.zeros((count, 4))
+	quaternions[:, 3] = 1.0
+	quaternions[:, 0:3] = rng.normal(0.0, spread, (count, 3))
+	return quaternions / np.linalg.norm(quaternions, axis=1)[:, None]
+
+# returns bone names, parent ids, local positions, local quaternions and (B, 4, 4) inverse world matrices.
+# Bone 0 is the world bone, every other bone hangs below a random earlier bone.
+def makeSkeleton(rng, numBones):
+	names = ["World"] + ["Bone_%03d" % i for i in range(1, numBones)]
+	parents = np.array([-1] + [int(rng.integers(0, i)) for i in range(1, numBones)], dtype=np.int64)
+	positions = rng.uniform(-2.0, 2.0, (numBones, 3))
+	positions[0] = 0.0
+	quaternions = randomQuaternions(rng, numBones)
+	quaternions[0] = (0.0, 0.0, 0.0, 1.0)
+
+	localRotations = quaternionsToMatrices(quaternions)
+	worldMatrices = np.zeros((numBones, 4, 4))
+	for i in range(numBones):
+		local = np.eye(4)
+		local[0:3, 0:3] = localRotations[i]
+		local[3, 0:3] = positions[i]
+		worldMatrices[i] = local if parents[i] < 0 else local @ worldMatrices[parents[i]]
+
+	return names, parents, positions, quaternions, np.linalg.inv(worldMatrices)
+
+# returns the vertex positions, normals, tangents, binormals, uvs and triangles of a bumpy grid of about numVerts vertices
+def makeGrid(rng, numVerts, offset):
+	width = max(2, int(math.ceil(math.sqrt(numVerts))))
+	height = max(2, int(math.ceil(numVerts / width)))
+	u, v = np.meshgrid(np.linspace(0.0, 1.0, width), np.linspace(0.0, 1.0, height))
+	u = u.ravel()
+	v = v.ravel()
+
+	positions = np.stack([u * 10.0 - 5.0, v * 10.0 - 5.0, rng.normal(0.0, 0.1, u.size)], axis=1) + offset
+	normals = np.stack([rng.normal(0.0, 0.1, u.size), rng.normal(0.0, 0.1, u.size), np.ones(u.size)], axis=1)
+	normals /= np.linalg.norm(normals, axis=1)[:, None]
+	tangents = np.cross(normals, [0.0, 1.0, 0.0])
+	tangents /= np.linalg.norm(tangents, axis=1)[:, None]
+	binormals = np.cross(normals, tangents)
+	uvs = np.stack([u, v], axis=1)
+
+	cells = (np.arange(height - 1)[:, None] * width + np.arange(width - 1)[None, :]).ravel()
+	triangles = np.concatenate([
+		np.stack([cells, cells + 1, cells + width + 1], axis=1),
+		np.stack([cells, cells + width + 1, cells + width], axis=1)])
+
+	return positions, normals, tangents, binormals, uvs, triangles
+
+# returns (V, slots) bone ids and weights summing to total, with influences non-zero weights on distinct
+# random bones and the remaining slots padded with the first bone at weight 0
+def makeInfluences(rng, numVerts, numBones, influences, slots, total=255):
+	influences = max(1, min(influences, slots, numBones - 1))
+	boneIds = np.empty((numVerts, slots), dtype=np.int64)
+	for i in range(numVerts):
+		boneIds[i, 0:influences] = rng.choice(np.arange(1, numBones), influences, replace=False)
+	boneIds[:, influences:] = boneIds[:, 0:1]
+
+	weights = np.zeros((numVerts, slots))
+	weights[:, 0:influences] = rng.uniform(0.1, 1.0, (numVerts, influences))
+	weights = -np.sort(-weights, axis=1)
+	if total is None:
+		return boneIds, weights / weights.sum(axis=1)[:, None]
+
+	quantized = np.floor(total * weights / weights.sum(axis=1)[:, None]).astype(np.int64)
+	quantized[:, 0] += total - quantized.sum(axis=1)
+	return boneIds, quantized
+
+def formatMatrix(matrix):
+	return ' '.join('%.8f' % value for value in matrix.ravel())
+
+def writeSkeleton(file, skeleton):
+	names, parents, positions, quaternions, inverseWorldMatrices = skeleton
+	for i, name in enumerate(names):
+		file.write('%d "%s" %d ' % (i, name, parents[i]))
+		file.write('%.8f %.8f %.8f ' % tuple(positions[i]))
+		file.write('%.8f %.8f %.8f %.8f ' % tuple(quaternions[i]))
+		file.write(formatMatrix(inverseWorldMatrices[i]) + '\n')
+
+def writeCN6(path, rng, skeleton, options):
+	numBones = len(skeleton[0])
+	with open(path, 'w') as file:
+		file.write("// CivNexus6 CN6 - synthetic benchmark asset\n")
+		file.write("skeleton\n")
+		writeSkeleton(file, skeleton)
+		file.write("meshes:%d\n" % options.meshes)
+		for m in range(options.meshes):
+			positions, normals, tangents, binormals, uvs, triangles = makeGrid(rng, options.verts, [12.0 * m, 0.0, 0.0])
+			boneIds, boneWeights = makeInfluences(rng, len(positions), numBones, options.influences, 8)
+			uvs3 = np.concatenate([uvs, uvs, uvs], axis=1)
+			uvs3[:, 1::2] = 1 - uvs3[:, 1::2]
+
+			file.write('mesh:"Mesh_%02d"\n' % m)
+			file.write("materials\n")
+			file.write('"Material_%02d"\n' % m)
+			file.write("vertices\n")
+			rowFormat = ' '.join(['%.8f'] * 18 + ['%d'] * 16) + '\n'
+			rows = np.concatenate([positions, normals, tangents, binormals, uvs3], axis=1).tolist()
+			for row, ids, weights in zip(rows, boneIds.tolist(), boneWeights.tolist()):
+				file.write(rowFormat % tuple(row + ids + weights))
+			file.write("triangles\n")
+			for triangle in triangles.tolist():
+				file.write('%d %d %d 0\n' % tuple(triangle))
+		file.write("end")
+
+def writeBR2(path, rng, skeleton, options):
+	numBones = len(skeleton[0])
+	with open(path, 'w') as file:
+		file.write("// Nexus Buddy BR2 - synthetic benchmark asset\n")
+		file.write("skeleton\n")
+		writeSkeleton(file, skeleton)
+		file.write("meshes:%d\n" % options.meshes)
+		for m in range(options.meshes):
+			positions, normals, tangents, binormals, uvs, triangles = makeGrid(rng, options.verts, [12.0 * m, 0.0, 0.0])
+			boneIds, boneWeights = makeInfluences(rng, len(positions), numBones, options.influences, 4)
+			uvs = uvs.copy()
+			uvs[:, 1] = 1 - uvs[:, 1]
+
+			file.write('mesh:"Mesh_%02d"\n' % m)
+			file.write("vertices\n")
+			rowFormat = ' '.join(['%.8f'] * 8 + ['%d'] * 8 + ['%.8f'] * 6) + '\n'
+			for row in zip(positions.tolist(), normals.tolist(), uvs.tolist(), boneIds.tolist(), boneWeights.tolist(), tangents.tolist(), binormals.tolist()):
+				file.write(rowFormat % tuple(sum(row, [])))
+			file.write("triangles\n")
+			for triangle in triangles.tolist():
+				file.write('%d %d %d\n' % tuple(triangle))
+		file.write("end")
+
+def writeNB2(path, rng, skeleton, options):
+	names, parents, positions, quaternions, inverseWorldMatrices = skeleton
+	numBones = len(names)
+	with open(path, 'w') as file:
+		file.write("// Nexus Buddy NB2 - synthetic benchmark asset\n")
+		file.write("Frames: 1\n")
+		file.write("Frame: 1\n")
+		file.write("Meshes: %d\n" % options.meshes)
+		for m in range(options.meshes):
+			meshPositions, normals, tangents, binormals, uvs, triangles = makeGrid(rng, options.verts, [12.0 * m, 0.0, 0.0])
+			boneIds, boneWeights = makeInfluences(rng, len(meshPositions), numBones, options.influences, 4, total=None)
+
+			file.write('"Mesh_%02d" 0 %d\n' % (m, m))
+			file.write("%d\n" % len(meshPositions))
+			for position, uv, ids, weights in zip(meshPositions.tolist(), uvs.tolist(), boneIds.tolist(), boneWeights.tolist()):
+				file.write('0 %.8f %.8f %.8f %.8f %.8f' % tuple(position + [uv[0], 1 - uv[1]]))
+				file.write(' %d %.8f %d %.8f %d %.8f %d %.8f\n' % tuple(value for pair in zip(ids, weights) for value in pair))
+			file.write("%d\n" % len(normals))
+			for normal in normals.tolist():
+				file.write('%.8f %.8f %.8f\n' % tuple(normal))
+			file.write("%d\n" % len(triangles))
+			for triangle in triangles.tolist():
+				file.write('0 %d %d %d %d %d %d 1\n' % tuple(triangle + triangle))
+
+		file.write("Materials: %d\n" % options.meshes)
+		for m in range(options.meshes):
+			file.write('"Material_%02d"\n' % m)
+			for color in range(4):
+				file.write("0.80000000 0.80000000 0.80000000 1.00000000\n")
+			file.write("0.00000000\n")
+			file.write("1.00000000\n")
+			file.write('"Material_%02d.dds"\n' % m)
+			file.write('""\n')
+
+		file.write("Bones: %d\n" % numBones)
+		for i, name in enumerate(names):
+			file.write('"%s"\n' % name)
+			file.write('"%s"\n' % (names[parents[i]] if parents[i] >= 0 else ""))
+			file.write('0 %.8f %.8f %.8f %.8f %.8f %.8f %.8f\n' % tuple(np.concatenate([positions[i], quaternions[i]])))
+			file.write("0\n")
+			file.write("0\n")
+
+def writeNA2(path, rng, skeleton, options):
+	names, parents, positions, quaternions, inverseWorldMatrices = skeleton
+	numBones = len(names)
+	worldMatrices = np.linalg.inv(inverseWorldMatrices)
+	with open(path, 'w') as file:
+		file.write("FrameSets: %d\n" % options.framesets)
+		for frameSet in range(options.framesets):
+			file.write("FrameCount: %d\n" % options.frames)
+			file.write("FirstFrame: 0\n")
+			file.write("LastFrame: %d\n" % (options.frames - 1))
+			file.write("FPS: 30\n")
+			file.write("Bones: %d\n" % numBones)
+			for i, name in enumerate(names):
+				file.write("%s\n" % name)
+
+				# a smooth random sway of the bind pose, with some bones holding still
+				moving = rng.random() < 0.8
+				phases = rng.uniform(0.0, 2 * math.pi, 3)
+				for frame in range(options.frames):
+					matrix = worldMatrices[i].copy()
+					if moving and i > 0:
+						angles = 0.2 * np.sin(phases + frame * 2 * math.pi / max(1, options.frames))
+						sway = np.concatenate([np.sin(angles / 2), [np.cos(np.linalg.norm(angles) / 2)]])
+						sway /= np.linalg.norm(sway)
+						matrix[0:3, 0:3] = quaternionsToMatrices(sway[None, :])[0] @ matrix[0:3, 0:3]
+					file.write(formatMatrix(matrix) + '\n')
+
+def main():
+	parser = argparse.ArgumentParser(description="Write synthetic .cn6, .na2, .nb2 and .br2 benchmark assets")
+	parser.add_argument("--out", default="assets", help="output directory")
+	parser.add_argument("--name", default="synthetic", help="base name of the written files")
+	parser.add_argument("--bones", type=int, default=64, help="bones including the world bone")
+	parser.add_argument("--meshes", type=int, default=2, help="meshes per model")
+	parser.add_argument("--verts", type=int, default=10000, help="approximate vertices per mesh")
+	parser.add_argument("--influences", type=int, default=4, help="bone influences per vertex (at most 8 for .cn6 and 4 for .nb2/.br2)")
+	parser.add_argument("--frames", type=int, default=60, help="frames per frameset")
+	parser.add_argument("--framesets", type=int, default=1, help="framesets per animation")
+	parser.add_argument("--formats", default="cn6,na2,nb2,br2", help="comma separated formats to write")
+	parser.add_argument("--seed", type=int, default=0, help="random seed")
+	options = parser.parse_args()
+
+	if options.bones < 2:
+		parser.error("--bones must be at least 2")
+
+	os.makedirs(options.out, exist_ok=True)
+	writers = {'cn6': writeCN6, 'na2': writeNA2, 'nb2': writeNB2, 'br2': writeBR2}
+	for extension in options.formats.split(','):
+		rng = np.random.default_rng(options.seed)
+		skeleton = makeSkeleton(rng, options.bones)
+		path = os.path.join(options.out, "%s.%s" % (options.name, extension))
+		writers[extension](path, rng, skeleton, options)
+		print("Wrote %s" % path)
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,227 @@
+# Runs the import and export scripts headless in Blender on generated assets and compares the timings of
+# their phases against a stored baseline, flagging regressions beyond a threshold.
+#
+#   python generate_assets.py --out assets
+#   python run_benchmark.py --blender /path/to/blender --assets assets --update-baseline
+#   python run_benchmark.py --blender /path/to/blender --assets assets
+#   python run_benchmark.py --blender27 /path/to/blender2.79 --assets assets --cases import_nb2,export_br2
+#
+# Every case runs in a fresh Blender process (blender --background --python run_benchmark.py -- --worker ...).
+# The 2.7 cases run in the Blender given by --blender27, the others in the one given by --blender.
+# Phase timings come from the .profile.json reports the scripts write; import_nb2 only gets a total.
+# bpy is imported by the worker alone, so the runner itself works with any Python.
+
+import os
+import sys
+import json
+import time
+import argparse
+import shutil
+import tempfile
+import subprocess
+
+REPOSITORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# case name: (add-on folder, asset extension)
+CASES = {
+	'import_cn6': ('Blender-2.8-Addons', 'cn6'),
+	'export_cn6': ('Blender-2.8-Addons', 'cn6'),
+	'import_na2': ('Blender-2.8-Addons', 'na2'),
+	'import_nb2': ('Blender-2.7-Addons', 'nb2'),
+	'export_br2': ('Blender-2.7-Addons', 'nb2'),
+}
+DEFAULT_CASES = 'import_cn6,export_cn6,import_na2'
+
+###### WORKER, RUNS INSIDE BLENDER #######
+
+def clearScene():
+	import bpy
+	for collection in (bpy.data.objects, bpy.data.meshes, bpy.data.armatures, bpy.data.actions, bpy.data.materials):
+		for item in list(collection):
+			collection.remove(item)
+
+# returns the summed seconds per phase of a profile report, and removes the report
+def readProfile(path):
+	reportPath = path + '.profile.json'
+	if not os.path.exists(reportPath):
+		return {}
+	with open(reportPath) as file:
+		report = json.load(file)
+	os.remove(reportPath)
+	return dict((name, phase['seconds']) for name, phase in report['phases'].items())
+
+def runCase(case, asset, workDir):
+	import importlib
+
+	clearScene()
+	if case == 'import_cn6':
+		io_import_cn6 = importlib.import_module('io_import_cn6')
+		start = time.perf_counter()
+		io_import_cn6.do_import(asset, USE_CACHE=False, PROFILE=True)
+		seconds = time.perf_counter() - start
+		phases = readProfile(asset)
+
+	elif case == 'export_cn6':
+		io_import_cn6 = importlib.import_module('io_import_cn6')
+		io_export_cn6 = importlib.import_module('io_export_cn6')
+		io_import_cn6.do_import(asset, USE_CACHE=False)
+		output = os.path.join(workDir, 'export.cn6')
+		start = time.perf_counter()
+		io_export_cn6.do_export(output, True, False, profile=True)
+		seconds = time.perf_counter() - start
+		phases = readProfile(output)
+
+	elif case == 'import_na2':
+		io_import_cn6 = importlib.import_module('io_import_cn6')
+		io_import_na2 = importlib.import_module('io_import_na2')
+		io_import_cn6.do_import(os.path.splitext(asset)[0] + '.cn6', USE_CACHE=False)
+		start = time.perf_counter()
+		io_import_na2.import_na2(asset, profile=True)
+		seconds = time.perf_counter() - start
+		phases = readProfile(asset)
+
+	elif case == 'import_nb2':
+		io_import_nb2 = importlib.import_module('io_import_nb2')
+		start = time.perf_counter()
+		io_import_nb2.do_import(asset)
+		seconds = time.perf_counter() - start
+		phases = {}
+
+	elif case == 'export_br2':
+		io_import_nb2 = importlib.import_module('io_import_nb2')
+		io_export_br2 = importlib.import_module('io_export_br2')
+		io_import_nb2.do_import(asset)
+		output = os.path.join(workDir, 'export.br2')
+		start = time.perf_counter()
+		io_export_br2.do_export(output, profile=True)
+		seconds = time.perf_counter() - start
+		phases = readProfile(output)
+
+	phases['total'] = seconds
+	return phases
+
+def worker(options):
+	sys.path.insert(0, options.addons)
+	workDir = tempfile.mkdtemp(prefix='civ_benchmark_')
+	try:
+		phases = runCase(options.case, options.asset, workDir)
+	finally:
+		shutil.rmtree(workDir, ignore_errors=True)
+	with open(options.result, 'w') as file:
+		json.dump(phases, file)
+
+###### RUNNER #######
+
+# returns the Blender executable that runs the add-ons of the given folder
+def blenderFor(options, addonFolder):
+	if addonFolder == 'Blender-2.7-Addons':
+		return options.blender27
+	return options.blender
+
+# runs a case in a fresh background Blender and returns its seconds per phase
+def runInBlender(options, case):
+	addonFolder, extension = CASES[case]
+	asset = os.path.abspath(os.path.join(options.assets, '%s.%s' % (options.name, extension)))
+	handle, resultPath = tempfile.mkstemp(suffix='.json')
+	os.close(handle)
+	try:
+		command = [blenderFor(options, addonFolder), '--background', '--factory-startup', '--python-exit-code', '1',
+			'--python', os.path.abspath(__file__), '--',
+			'--worker', '--case', case, '--asset', asset,
+			'--addons', os.path.join(REPOSITORY, addonFolder), '--result', resultPath]
+		completed = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, universal_newlines=True)
+		if completed.returncode != 0:
+			print(completed.stdout)
+			raise RuntimeError("Case %s failed in Blender (exit code %d)" % (case, completed.returncode))
+		with open(resultPath) as file:
+			return json.load(file)
+	finally:
+		os.remove(resultPath)
+
+# returns (case, phase, baseline, current) for every phase slower than the baseline by more than the
+# threshold fraction and by more than minSeconds
+def findRegressions(results, baseline, threshold, minSeconds):
+	regressions = []
+	for case, phases in sorted(results.items()):
+		for phase, seconds in sorted(phases.items()):
+			reference = baseline.get(case, {}).get(phase)
+			if reference is None:
+				continue
+			if seconds > reference * (1 + threshold) and seconds - reference > minSeconds:
+				regressions.append((case, phase, reference, seconds))
+	return regressions
+
+def runner(options):
+	cases = options.cases.split(',')
+	for case in cases:
+		if case not in CASES:
+			raise SystemExit("Unknown case %s, expected one of %s" % (case, ', '.join(sorted(CASES))))
+		if not blenderFor(options, CASES[case][0]):
+			raise SystemExit("Case %s runs the 2.7 add-ons and needs --blender27" % case)
+
+	results = {}
+	for case in cases:
+
+		# the fastest of the repeats is kept for every phase
+		for repeat in range(options.repeat):
+			print("Running %s (%d/%d)" % (case, repeat + 1, options.repeat))
+			for phase, seconds in runInBlender(options, case).items():
+				results.setdefault(case, {})[phase] = min(seconds, results.get(case, {}).get(phase, seconds))
+
+	baseline = {}
+	if os.path.exists(options.baseline):
+		with open(options.baseline) as file:
+			baseline = json.load(file)
+
+	print("%-12s %-20s %10s %10s" % ("case", "phase", "baseline", "seconds"))
+	for case, phases in sorted(results.items()):
+		for phase, seconds in sorted(phases.items()):
+			reference = baseline.get(case, {}).get(phase)
+			print("%-12s %-20s %10s %10.4f" % (case, phase, '-' if reference is None else '%.4f' % reference, seconds))
+
+	if options.output:
+		with open(options.output, 'w') as file:
+			json.dump(results, file, indent=1)
+
+	if options.update_baseline:
+		baseline.update(results)
+		with open(options.baseline, 'w') as file:
+			json.dump(baseline, file, indent=1)
+		print("Baseline written to %s" % options.baseline)
+		return 0
+
+	regressions = findRegressions(results, baseline, options.threshold, options.min_seconds)
+	for case, phase, reference, seconds in regressions:
+		print("REGRESSION %s/%s: %.4f s -> %.4f s (+%.0f%%)" % (case, phase, reference, seconds, 100 * (seconds / reference - 1)))
+	return 1 if regressions else 0
+
+def main():
+	# Blender passes the script's own arguments after '--'
+	argv = sys.argv[sys.argv.index('--') + 1:] if '--' in sys.argv else sys.argv[1:]
+
+	parser = argparse.ArgumentParser(description="Benchmark the Civ import/export scripts in background Blender")
+	parser.add_argument("--blender", default="blender", help="Blender 2.8+ executable for the Blender-2.8-Addons cases")
+	parser.add_argument("--blender27", default="", help="Blender 2.7x executable for the Blender-2.7-Addons cases")
+	parser.add_argument("--assets", default="assets", help="directory written by generate_assets.py")
+	parser.add_argument("--name", default="synthetic", help="base name of the assets")
+	parser.add_argument("--cases", default=DEFAULT_CASES, help="comma separated cases: %s" % ', '.join(sorted(CASES)))
+	parser.add_argument("--repeat", type=int, default=3, help="runs per case, the fastest is kept")
+	parser.add_argument("--baseline", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json"), help="stored baseline timings")
+	parser.add_argument("--update-baseline", action="store_true", help="store these timings as the baseline instead of comparing")
+	parser.add_argument("--threshold", type=float, default=0.2, help="slowdown fraction reported as a regression")
+	parser.add_argument("--min-seconds", type=float, default=0.05, help="ignore slowdowns smaller than this")
+	parser.add_argument("--output", default="", help="also write the timings to this JSON file")
+	parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+	parser.add_argument("--case", help=argparse.SUPPRESS)
+	parser.add_argument("--asset", help=argparse.SUPPRESS)
+	parser.add_argument("--addons", help=argparse.SUPPRESS)
+	parser.add_argument("--result", help=argparse.SUPPRESS)
+	options = parser.parse_args(argv)
+
+	if options.worker:
+		worker(options)
+	else:
+		sys.exit(runner(options))
+
+if __name__ == "__main__":
+	main()
@@ -25,7 +25,35 @@ from bpy.props import (
 from bpy_extras.io_utils import unpack_list, unpack_face_list
 import re
 import os
+import sys
 import glob
+import json
+import time
+import tracemalloc
+import logging
+
+# batch conversion messages, including those of its own import and export, use the civ_blender logger
+LOG_NAME = "civ_blender"
+log = logging.getLogger(LOG_NAME + "." + __name__)
+
+VERBOSITY_ITEMS = (
+    ('QUIET', "Quiet", "Warnings only"),
+    ('SUMMARY', "Summary", "Totals per file, mesh and animation"),
+    ('DEBUG', "Debug", "Everything, including per bone, vertex and frame detail"),
+)
+VERBOSITY_LEVELS = {'QUIET': logging.WARNING, 'SUMMARY': logging.INFO, 'DEBUG': logging.DEBUG}
+
+
+# sends the shared add-on logger to the console at the given verbosity
+def setVerbosity(verbosity):
+    addonLog = logging.getLogger(LOG_NAME)
+    if not addonLog.handlers:
+        handler = logging.StreamHandler(sys.stdout)
+        handler.setFormatter(logging.Formatter("%(name)s: %(message)s"))
+        addonLog.addHandler(handler)
+        addonLog.propagate = False
+    addonLog.setLevel(VERBOSITY_LEVELS[verbosity])
+
 
 # Converts ms3d euler angles to a rotation matrix
 def RM(a):
@@ -68,7 +96,7 @@ def getNextLine(file):
     while ready == False:
         line = file.readline()
         if len(line) == 0:
-            print ("Warning: End of file reached.")
+            log.warning("End of file reached.")
             return line
         ready = True
         line = line.strip()
@@ -185,7 +213,7 @@ def getBoneWeights(boneName, weights):
     return vgroup_data
 
 
-def do_import(path, materialNameToMaterialMap, DELETE_TOP_BONE=True):
+def do_import(path, materialNameToMaterialMap, profile, DELETE_TOP_BONE=True):
     # get scene
     scn = bpy.context.scene
     if scn == None:
@@ -245,7 +273,10 @@ def do_import(path, materialNameToMaterialMap, DELETE_TOP_BONE=True):
             quaternions.append([float(lines[6]), float(lines[7]), float(lines[8]), float(lines[9])])
             boneCount = boneCount + 1
 
-    print (boneNameDict)
+    log.info("%d bones", boneCount)
+    log.debug("Bones: %s", boneNameDict)
+    profile.count(bones=boneCount)
+    logBones = log.isEnabledFor(logging.DEBUG)
     for i in range(boneCount):
         # read name
         fullName = boneNameDict[i]
@@ -265,10 +296,8 @@ def do_import(path, materialNameToMaterialMap, DELETE_TOP_BONE=True):
         rotMatrix = quaternion.to_matrix()
         rotMatrix.transpose()  # Need to transpose to get same behaviour as 2.49 script
 
-        print ("Bone Data")
-        print (fullName)
-        print (pos)
-        print (rotMatrix)
+        if logBones:
+            log.debug("Bone %s: position %s, rotation %s", fullName, pos, rotMatrix)
 
         boneLength = 3
         # set position and orientation
@@ -323,8 +352,7 @@ def do_import(path, materialNameToMaterialMap, DELETE_TOP_BONE=True):
     meshes = []
     meshObjects = []
 
-    print('Num Meshes')
-    print(numMeshes)
+    log.info("%d meshes", numMeshes)
 
     for i in range(numMeshes):
 
@@ -343,8 +371,7 @@ def do_import(path, materialNameToMaterialMap, DELETE_TOP_BONE=True):
             if (not currentLine.startswith('materials') and not currentLine.startswith('vertices')):
                 materialNames.append(currentLine[1:-1])
 
-        print ("materialNames")
-        print (materialNames)
+        log.debug("%s materials: %s", meshName, materialNames)
 
         # read vertices
         coords = []
@@ -410,11 +437,13 @@ def do_import(path, materialNameToMaterialMap, DELETE_TOP_BONE=True):
 
         keyVertexGroup = meshOb.vertex_groups.get("VERTEX_KEYS")
 
+        logVertices = log.isEnabledFor(logging.DEBUG)
         for v, vertex in enumerate(meshes[i].vertices):
             encoded_weight = (v / 2000000)
             keyVertexGroup.add([v], encoded_weight, 'ADD')
-            print ("encoded_weight {}".format(encoded_weight))
-            print ("vertex.bevel_weight {}".format(vertex.groups[keyVertexGroup.index].weight))
+            if logVertices:
+                log.debug("%d: encoded_weight %s, stored weight %s", v, encoded_weight,
+                          vertex.groups[keyVertexGroup.index].weight)
             originalTangentsBinormals[str(v)] = normalsTangentsBinormals[v]
 
         meshes[i]['originalTangentsBinormals'] = originalTangentsBinormals
@@ -473,6 +502,7 @@ def do_import(path, materialNameToMaterialMap, DELETE_TOP_BONE=True):
             mesh.uv_layers[2].data[l.index].uv = uvs3[l.vertex_index]
 
         mesh.validate(clean_customdata=False)
+        profile.count(meshes=1, verts=len(mesh.vertices), loops=len(mesh.loops), polygons=len(mesh.polygons))
 
         clnors = array.array('f', [0.0] * (len(mesh.loops) * 3))
         mesh.loops.foreach_get("normal", clnors)
@@ -524,7 +554,7 @@ def do_import(path, materialNameToMaterialMap, DELETE_TOP_BONE=True):
         while not bone.parent is None:
             bone = bone.parent
 
-        print ('Found World Bone: %s' % bone.name)
+        log.info('Found World Bone: %s', bone.name)
 
         name = bone.name
         armOb.name = name
@@ -540,8 +570,8 @@ def do_import(path, materialNameToMaterialMap, DELETE_TOP_BONE=True):
 
     return ""
 
-def do_export(filename):
-    print ("Start CN6 Export...")
+def do_export(filename, profile):
+    log.info("Start CN6 Export to %s", filename)
 
     file = open( filename, 'w')
     filedata = "// CivNexus6 CN6 - Exported from Blender for import to CivNexus6\n"
@@ -555,7 +585,7 @@ def do_export(filename):
                 modelObs[object.name] = object
 
             if object.type == 'MESH':
-                print ("Getting parent for mesh: %s" % object.name)
+                log.debug("Getting parent for mesh: %s", object.name)
                 parentArmOb = object.modifiers[0].object
                 if not parentArmOb.name in modelMeshes:
                     modelMeshes[parentArmOb.name] = []
@@ -569,6 +599,7 @@ def do_export(filename):
 
             armOb = modelObs[modelObName]
             armature = armOb.data
+            profile.count(bones=len(armature.bones))
 
             # Calc bone depths and sort
             boneDepths = []
@@ -591,10 +622,7 @@ def do_export(filename):
             filedata += '%.8f %.8f %.8f %.8f ' % (0.0, 0.0, 0.0, 1.0)
             filedata += '%.8f %.8f %.8f %.8f %.8f %.8f %.8f %.8f %.8f %.8f %.8f %.8f %.8f %.8f %.8f %.8f\n' % (1.0, 0.0, 0.0, 0.0, 0.0, 1.0, 0.0, 0.0, 0.0, 0.0, 1.0, 0.0, 0.0, 0.0, 0.0, 1.0)
 
-            print ("armOb.name/armature.bones[0].name/len(boneIds)")
-            print (armOb.name)
-            print (armature.bones[0].name)
-            print (len(boneIds))
+            log.info("%s: %d bones, first bone %s", armOb.name, len(boneIds), armature.bones[0].name)
 
             if (len(boneIds) > 1 or armOb.name != armature.bones[0].name):
                 for boneid, boneTuple in enumerate(sortedBones):
@@ -643,6 +671,7 @@ def do_export(filename):
 
                     mesh = meshObject.data
                     meshName = meshObject.name
+                    profile.count(meshes=1, verts=len(mesh.vertices), loops=len(mesh.loops), polygons=len(mesh.polygons))
 
                     filedata += 'mesh:"%s"\n' % meshName
 
@@ -664,7 +693,7 @@ def do_export(filename):
                                     weight = vertex.groups[keyVertexGroup.index].weight * 2000000
                                     decodedVertexIndex = str(int(round(weight)))
 
-                                    print ("{}: decodedVertexIndex:{}".format(index, decodedVertexIndex))
+                                    log.debug("%d: decodedVertexIndex:%s", index, decodedVertexIndex)
 
                                     if mesh['originalTangentsBinormals'].get(decodedVertexIndex) is not None:
                                         tangentsBinormals = mesh['originalTangentsBinormals'][decodedVertexIndex]
@@ -736,13 +765,8 @@ def do_export(filename):
                     # Get Bone Weights
                     weights = meshNormalizedWeights(meshObject, mesh)
                     vertexBoneWeights = {}
-                    print (meshName)
-                    print ("len(mesh.polygons)")
-                    print (len(mesh.polygons))
-                    print ("len(mesh.loops)")
-                    print (len(mesh.loops))
-                    print ("len(weights[0])")
-                    print (len(weights[0]))
+                    log.info("%s: %d polygons, %d loops, %d vertex groups", meshName, len(mesh.polygons), len(mesh.loops),
+                             len(weights[0]))
 
                     for boneName in boneIds.keys():
                         vgroupDataForBone = getBoneWeights(boneName, weights)
@@ -754,10 +778,7 @@ def do_export(filename):
                                 vertexBoneWeights[vertexId] = []
                             vertexBoneWeights[vertexId].append((boneName, weight))
 
-                    print ("len(mesh.vertices)")
-                    print (len(mesh.vertices))
-                    print ("len(vertexBoneWeights.keys())")
-                    print (len(vertexBoneWeights.keys()))
+                    log.info("%s: %d vertices (%d weighted)", meshName, len(mesh.vertices), len(vertexBoneWeights))
 
                     grannyVertexBoneWeights = {}
                     for vertId in vertexBoneWeights.keys():
@@ -819,9 +840,7 @@ def do_export(filename):
 
                     filedata += "vertices\n"
 
-                    print ("grannyVertexBoneWeights")
-                    print (len(grannyVertexBoneWeights))
-                    print ("Write Vertices")
+                    log.info("%s: writing %d vertices with bone weights", meshName, len(grannyVertexBoneWeights))
 
                     # Get unique vertex/uv coordinate combinations
                     uniqueVertSet = set()
@@ -939,9 +958,8 @@ def do_export(filename):
                     for triangle in sortedOutputTriangles:
                         filedata += '%i %i %i %i\n' % (triangle[0],triangle[1],triangle[2], triangle[3])
 
-                    print ("meshName: {}".format(meshName))
-                    print ("preservedTangsBinormsCount: {}".format(preservedTangsBinormsCount))
-                    print ("calculatedTangsBinormsCount: {}".format(calculatedTangsBinormsCount))
+                    log.info("%s: %d preserved and %d calculated tangents/binormals", meshName, preservedTangsBinormsCount,
+                             calculatedTangsBinormsCount)
 
         for armObject in modelObs.values():
             if armObject.type == 'ARMATURE':
@@ -968,12 +986,98 @@ def do_export(filename):
         file.close()
         raise
 
-    print ("End CN6 Export.")
+    log.info("End CN6 Export.")
     return ""
 
 
-def do_batch_convert(filename):
-    print ("Start batch .cn6 -> .cn6 conversion...")
+# identical copy of PhaseProfile in Blender-2.8-Addons/io_import_cn6.py, change all copies together
+class PhaseProfile:
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.phases = []
+        self.current = None
+        self.startTime = time.perf_counter()
+        self.ownsTracemalloc = enabled and not tracemalloc.is_tracing()
+        if self.ownsTracemalloc:
+            tracemalloc.start()
+
+    # ends the current phase and starts the named one
+    def begin(self, name, **counts):
+        if not self.enabled:
+            return
+        self.end()
+        if hasattr(tracemalloc, 'reset_peak'):
+            tracemalloc.reset_peak()
+        self.current = {'name': name, 'start': time.perf_counter(), 'counts': {}}
+        self.count(**counts)
+
+    # adds to the counts (verts, loops, bones, keys...) of the current phase
+    def count(self, **counts):
+        if self.current is None:
+            return
+        phaseCounts = self.current['counts']
+        for key, value in counts.items():
+            phaseCounts[key] = phaseCounts.get(key, 0) + int(value)
+
+    def end(self):
+        if self.current is None:
+            return
+        phase = self.current
+        phase['seconds'] = time.perf_counter() - phase['start']
+        phase['start'] = phase['start'] - self.startTime
+        phase['peakBytes'] = tracemalloc.get_traced_memory()[1] if tracemalloc.is_tracing() else None
+        self.phases.append(phase)
+        self.current = None
+
+    # ends profiling and writes <path>.profile.json, and <path>.trace.json with chromeTrace
+    def write(self, path, chromeTrace=False):
+        if not self.enabled:
+            return
+        self.end()
+        totalSeconds = time.perf_counter() - self.startTime
+        if self.ownsTracemalloc:
+            tracemalloc.stop()
+            self.ownsTracemalloc = False
+
+        # repeated phases, such as one per mesh, are summed up
+        totals = {}
+        for phase in self.phases:
+            total = totals.setdefault(phase['name'], {'calls': 0, 'seconds': 0.0, 'peakBytes': None, 'counts': {}})
+            total['calls'] += 1
+            total['seconds'] += phase['seconds']
+            if phase['peakBytes'] is not None:
+                total['peakBytes'] = max(total['peakBytes'] or 0, phase['peakBytes'])
+            for key, value in phase['counts'].items():
+                total['counts'][key] = total['counts'].get(key, 0) + value
+
+        report = {'file': path, 'seconds': totalSeconds, 'phases': totals, 'timeline': self.phases}
+        with open(path + '.profile.json', 'w') as file:
+            json.dump(report, file, indent=1)
+        log.info("Profile written to %s.profile.json", path)
+
+        if chromeTrace:
+            events = []
+            for phase in self.phases:
+                args = dict(phase['counts'])
+                args['peakBytes'] = phase['peakBytes']
+                events.append({'name': phase['name'], 'ph': 'X', 'pid': os.getpid(), 'tid': 0,
+                    'ts': phase['start'] * 1e6, 'dur': phase['seconds'] * 1e6, 'args': args})
+            with open(path + '.trace.json', 'w') as file:
+                json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, file)
+            log.info("Chrome trace written to %s.trace.json", path)
+
+
+def do_batch_convert(filename, verbosity='SUMMARY', profile=False, chrome_trace=False):
+    setVerbosity(verbosity)
+    phaseProfile = PhaseProfile(profile)
+    try:
+        return batchConvert(filename, phaseProfile)
+    finally:
+        phaseProfile.write(filename, chrome_trace)
+
+
+def batchConvert(filename, profile):
+    log.info("Start batch .cn6 -> .cn6 conversion of %s", filename)
 
     directory = os.path.dirname(filename)
 
@@ -989,26 +1093,30 @@ def do_batch_convert(filename):
         # Handle *__modelname.cn6
         path = nb2FilenameRoot + "__*.cn6"
         for filename in glob.glob(path):
-            print("Import %s" % filename)
+            log.info("Import %s", filename)
+            profile.begin("import", files=1)
             materialNameToMaterialMap = {}
-            do_import(filename, materialNameToMaterialMap)
+            do_import(filename, materialNameToMaterialMap, profile)
             shortFilename = os.path.basename(filename)
             cn6Filename = directory + "\\" + shortFilename.replace("_batch", "").replace(".cn6", ".cn6")
-            print("Export %s" % cn6Filename)
-            do_export(cn6Filename)
+            log.info("Export %s", cn6Filename)
+            profile.begin("export", files=1)
+            do_export(cn6Filename, profile)
             exportDone = True
 
         # Handle direct matches
         path = nb2FilenameRoot + "_batch.cn6"
         materialNameToMaterialMap = {}
         for filename in glob.glob(path):
-            print("Import %s" % filename)
-            materialNameToMaterialMap = do_import(filename, materialNameToMaterialMap)
+            log.info("Import %s", filename)
+            profile.begin("import", files=1)
+            materialNameToMaterialMap = do_import(filename, materialNameToMaterialMap, profile)
 
         if not exportDone:
             cn6Filename = directory + "\\" + modelName.replace(".gr2", ".cn6")
-            print("Export %s" % cn6Filename)
-            do_export(cn6Filename)
+            log.info("Export %s", cn6Filename)
+            profile.begin("export", files=1)
+            do_export(cn6Filename, profile)
 
 
 ###### IMPORT OPERATOR #######
@@ -1021,9 +1129,16 @@ class ConvertCN6CN6(bpy.types.Operator):
 
     filepath = StringProperty(name="File Path", description="Filepath used for importing the DAT file", maxlen=1024,
                               default="")
+    verbosity = EnumProperty(name="Verbosity", description="Amount of console output", items=VERBOSITY_ITEMS,
+                             default='SUMMARY')
+    profile = BoolProperty(name="Write Profile", default=False,
+                           description="Write the time, memory peak and counts of each conversion phase to a "
+                                       ".profile.json file next to the .dat")
+    chrome_trace = BoolProperty(name="Write Chrome Trace", default=False,
+                                description="With Write Profile, also write a .trace.json file for chrome://tracing")
 
     def execute(self, context):
-        do_batch_convert(self.filepath)
+        do_batch_convert(self.filepath, self.verbosity, self.profile, self.chrome_trace)
         return {'FINISHED'}
 
     def invoke(self, context, event):
@@ -12,7 +12,38 @@ bl_info = {
 import bpy
 from mathutils import Vector, Quaternion, Matrix
 from bpy_extras.io_utils import unpack_list, unpack_face_list, ExportHelper
+import os
+import sys
+import json
+import time
+import tracemalloc
 import math
+import logging
+import numpy as np
+from bpy.props import IntProperty, EnumProperty, BoolProperty
+
+ROW_BLOCK_SIZE = 4096
+
+# br2 export messages, on the civ_blender logger
+LOG_NAME = "civ_blender"
+log = logging.getLogger(LOG_NAME + "." + __name__)
+
+VERBOSITY_ITEMS = (
+	('QUIET', "Quiet", "Warnings only"),
+	('SUMMARY', "Summary", "Totals per file, mesh and animation"),
+	('DEBUG', "Debug", "Everything, including per bone, vertex and frame detail"),
+	)
+VERBOSITY_LEVELS = {'QUIET': logging.WARNING, 'SUMMARY': logging.INFO, 'DEBUG': logging.DEBUG}
+
+# sends the shared add-on logger to the console at the given verbosity
+def setVerbosity(verbosity):
+	addonLog = logging.getLogger(LOG_NAME)
+	if not addonLog.handlers:
+		handler = logging.StreamHandler(sys.stdout)
+		handler.setFormatter(logging.Formatter("%(name)s: %(message)s"))
+		addonLog.addHandler(handler)
+		addonLog.propagate = False
+	addonLog.setLevel(VERBOSITY_LEVELS[verbosity])
 
 def getTranslationOrientation(ob):
 	if isinstance(ob, bpy.types.Bone):
@@ -66,6 +97,33 @@ def getBoneTreeDepth(bone, currentCount):
 		return currentCount
 		
 	
+# averages the normal, tangent and bitangent of each vertex's loops, as calculated by mesh.calc_tangents,
+# into a (V, 9) float64 array, summing the loops in polygon order
+def getAveragedLoopFrames(mesh):
+	numLoops = len(mesh.loops)
+	loopFrames = np.empty((numLoops, 9), dtype=np.float32)
+	for i, attribute in enumerate(("normal", "tangent", "bitangent")):
+		values = np.empty(numLoops * 3, dtype=np.float32)
+		mesh.loops.foreach_get(attribute, values)
+		loopFrames[:, 3 * i:3 * i + 3] = values.reshape(-1, 3)
+
+	loopVertexIndices = np.empty(numLoops, dtype=np.int32)
+	mesh.loops.foreach_get("vertex_index", loopVertexIndices)
+
+	loopStarts = np.empty(len(mesh.polygons), dtype=np.int32)
+	loopTotals = np.empty(len(mesh.polygons), dtype=np.int32)
+	mesh.polygons.foreach_get("loop_start", loopStarts)
+	mesh.polygons.foreach_get("loop_total", loopTotals)
+	polygonLoopOffsets = np.cumsum(loopTotals) - loopTotals
+	loopOrder = np.repeat(loopStarts - polygonLoopOffsets, loopTotals) + np.arange(loopTotals.sum())
+
+	numVerts = len(mesh.vertices)
+	frameSums = np.zeros((numVerts, 9))
+	np.add.at(frameSums, loopVertexIndices[loopOrder], loopFrames[loopOrder].astype(np.float64))
+	loopCounts = np.bincount(loopVertexIndices[loopOrder], minlength=numVerts)
+
+	return frameSums / np.maximum(loopCounts, 1)[:, None]
+
 def BPyMesh_meshWeight2List(ob, me):
     """ Takes a mesh and return its group names and a list of lists, one list per vertex.
     aligning the each vert list with the group names, each list contains float value for the weight.
@@ -118,8 +176,105 @@ def getBoneWeights(boneName, weights):
 	
 	return vgroup_data
 
-def do_export(filename):
-	print ("Start BR2 Export...")
+# formats the rows of (N, k) arrays placed side by side with one precompiled row format, yielding the
+# text of ROW_BLOCK_SIZE rows at a time rendered by a single % operation
+def formatRows(rowFormat, columnBlocks):
+	numRows = len(columnBlocks[0])
+	for start in range(0, numRows, ROW_BLOCK_SIZE):
+		stop = min(start + ROW_BLOCK_SIZE, numRows)
+		values = []
+		for rowParts in zip(*[block[start:stop].tolist() for block in columnBlocks]):
+			for part in rowParts:
+				values.extend(part)
+		yield (rowFormat * (stop - start)) % tuple(values)
+
+# identical copy of PhaseProfile in Blender-2.8-Addons/io_import_cn6.py, change all copies together
+class PhaseProfile:
+	def __init__(self, enabled=False):
+		self.enabled = enabled
+		self.phases = []
+		self.current = None
+		self.startTime = time.perf_counter()
+		self.ownsTracemalloc = enabled and not tracemalloc.is_tracing()
+		if self.ownsTracemalloc:
+			tracemalloc.start()
+
+	# ends the current phase and starts the named one
+	def begin(self, name, **counts):
+		if not self.enabled:
+			return
+		self.end()
+		if hasattr(tracemalloc, 'reset_peak'):
+			tracemalloc.reset_peak()
+		self.current = {'name': name, 'start': time.perf_counter(), 'counts': {}}
+		self.count(**counts)
+
+	# adds to the counts (verts, loops, bones, keys...) of the current phase
+	def count(self, **counts):
+		if self.current is None:
+			return
+		phaseCounts = self.current['counts']
+		for key, value in counts.items():
+			phaseCounts[key] = phaseCounts.get(key, 0) + int(value)
+
+	def end(self):
+		if self.current is None:
+			return
+		phase = self.current
+		phase['seconds'] = time.perf_counter() - phase['start']
+		phase['start'] = phase['start'] - self.startTime
+		phase['peakBytes'] = tracemalloc.get_traced_memory()[1] if tracemalloc.is_tracing() else None
+		self.phases.append(phase)
+		self.current = None
+
+	# ends profiling and writes <path>.profile.json, and <path>.trace.json with chromeTrace
+	def write(self, path, chromeTrace=False):
+		if not self.enabled:
+			return
+		self.end()
+		totalSeconds = time.perf_counter() - self.startTime
+		if self.ownsTracemalloc:
+			tracemalloc.stop()
+			self.ownsTracemalloc = False
+
+		# repeated phases, such as one per mesh, are summed up
+		totals = {}
+		for phase in self.phases:
+			total = totals.setdefault(phase['name'], {'calls': 0, 'seconds': 0.0, 'peakBytes': None, 'counts': {}})
+			total['calls'] += 1
+			total['seconds'] += phase['seconds']
+			if phase['peakBytes'] is not None:
+				total['peakBytes'] = max(total['peakBytes'] or 0, phase['peakBytes'])
+			for key, value in phase['counts'].items():
+				total['counts'][key] = total['counts'].get(key, 0) + value
+
+		report = {'file': path, 'seconds': totalSeconds, 'phases': totals, 'timeline': self.phases}
+		with open(path + '.profile.json', 'w') as file:
+			json.dump(report, file, indent=1)
+		log.info("Profile written to %s.profile.json", path)
+
+		if chromeTrace:
+			events = []
+			for phase in self.phases:
+				args = dict(phase['counts'])
+				args['peakBytes'] = phase['peakBytes']
+				events.append({'name': phase['name'], 'ph': 'X', 'pid': os.getpid(), 'tid': 0,
+					'ts': phase['start'] * 1e6, 'dur': phase['seconds'] * 1e6, 'args': args})
+			with open(path + '.trace.json', 'w') as file:
+				json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, file)
+			log.info("Chrome trace written to %s.trace.json", path)
+
+def do_export(filename, precision=8, verbosity='SUMMARY', profile=False, chrome_trace=False):
+	setVerbosity(verbosity)
+	log.info("Start BR2 Export to %s", filename)
+
+	phaseProfile = PhaseProfile(profile)
+	try:
+		return exportBR2(filename, precision, phaseProfile)
+	finally:
+		phaseProfile.write(filename, chrome_trace)
+
+def exportBR2(filename, precision, profile):
 	file = open( filename, 'w')
 	
 	filedata = "// Nexus Buddy BR2 - Exported from Blender for import to Nexus Buddy 2\n"
@@ -133,7 +288,7 @@ def do_export(filename):
 			modelObs[object.name] = object
 			
 		if object.type == 'MESH':
-			print ("Getting parent for mesh: %s" % object.name)
+			log.debug("Getting parent for mesh: %s", object.name)
 			parentArmOb = object.modifiers[0].object
 			if not parentArmOb.name in modelMeshes:
 				modelMeshes[parentArmOb.name] = []
@@ -146,6 +301,7 @@ def do_export(filename):
 		
 		armOb = modelObs[modelObName]
 		armature = armOb.data
+		profile.begin("skeleton", bones=len(armature.bones))
 		
 		# Calc bone depths and sort
 		boneDepths = []
@@ -168,10 +324,7 @@ def do_export(filename):
 		filedata += '%.8f %.8f %.8f %.8f ' % (0.0, 0.0, 0.0, 1.0)
 		filedata += '%.8f %.8f %.8f %.8f %.8f %.8f %.8f %.8f %.8f %.8f %.8f %.8f %.8f %.8f %.8f %.8f\n' % (1.0, 0.0, 0.0, 0.0, 0.0, 1.0, 0.0, 0.0, 0.0, 0.0, 1.0, 0.0, 0.0, 0.0, 0.0, 1.0)
 
-		print ("armOb.name/armature.bones[0].name/len(boneIds)")
-		print (armOb.name)
-		print (armature.bones[0].name)
-		print (len(boneIds))
+		log.info("%s: %d bones, first bone %s", armOb.name, len(boneIds), armature.bones[0].name)
 
 		if (len(boneIds) > 1 or armOb.name != armature.bones[0].name):
 			for boneid, boneTuple in enumerate(sortedBones):
@@ -221,64 +374,19 @@ def do_export(filename):
 			filedata += 'mesh:"%s"\n' % meshName
 
 			# Get Normals, Binormals and Tangents
-			vertexNormsBinormsTangs = {}
+			profile.begin("mesh preparation", verts=len(mesh.vertices), loops=len(mesh.loops), polygons=len(mesh.polygons))
 			#uv_layer = mesh.uv_layers[0].data
 			mesh.calc_tangents(mesh.uv_layers[0].name)
 
-			for poly in mesh.polygons:
-
-				for loop_index in poly.loop_indices:
-
-					currentVertexIndex = mesh.loops[loop_index].vertex_index
-
-					loop = mesh.loops[loop_index]
-
-					currentVertNormBinormTang = (loop.normal[0],loop.normal[1],loop.normal[2],
-												loop.tangent[0],loop.tangent[1],loop.tangent[2],
-												loop.bitangent[0],loop.bitangent[1],loop.bitangent[2])
-
-					if not currentVertexIndex in vertexNormsBinormsTangs:
-						vertexNormsBinormsTangs[currentVertexIndex] = []
-					vertexNormsBinormsTangs[currentVertexIndex].append(currentVertNormBinormTang)
-
-
-			vertexNormsBinormsTangsSelected = {}
-
-			for vertId in vertexNormsBinormsTangs.keys():
-
-				sum0, sum1, sum2, sum3, sum4, sum5, sum6, sum7, sum8 = 0,0,0,0,0,0,0,0,0
-
-				for currentrow in vertexNormsBinormsTangs[vertId]:
-					sum0 = sum0 + currentrow[0]
-					sum1 = sum1 + currentrow[1]
-					sum2 = sum2 + currentrow[2]
-
-					sum3 = sum3 + currentrow[3]
-					sum4 = sum4 + currentrow[4]
-					sum5 = sum5 + currentrow[5]
-
-					sum6 = sum6 + currentrow[6]
-					sum7 = sum7 + currentrow[7]
-					sum8 = sum8 + currentrow[8]
-
-				numRows = len(vertexNormsBinormsTangs[vertId])
-
-				vertexNormsBinormsTangsSelected[vertId] = (sum0/numRows, sum1/numRows, sum2/numRows,
-															sum3/numRows, sum4/numRows, sum5/numRows,
-															sum6/numRows, sum7/numRows, sum8/numRows)
+			vertexNormsBinormsTangsSelected = getAveragedLoopFrames(mesh)
 
 			# Get Bone Weights
+			profile.begin("bone weights", verts=len(mesh.vertices))
 			#parentArmOb = meshObject.modifiers[0].object
 
 			weights = meshNormalizedWeights(meshObject, mesh)
 			vertexBoneWeights = {}
-			print (meshName)
-			print ("len(mesh.polygons)")
-			print (len(mesh.polygons))
-			print ("len(mesh.loops)")
-			print (len(mesh.loops))
-			print ("len(weights[0])")
-			print (len(weights[0]))
+			log.info("%s: %d polygons, %d loops, %d vertex groups", meshName, len(mesh.polygons), len(mesh.loops), len(weights[0]))
 			
 			for boneName in boneIds.keys():
 				vgroupDataForBone = getBoneWeights(boneName, weights)
@@ -290,10 +398,7 @@ def do_export(filename):
 						vertexBoneWeights[vertexId] = []
 					vertexBoneWeights[vertexId].append((boneName, weight))
 			
-			print ("len(mesh.vertices)")
-			print (len(mesh.vertices))
-			print ("len(vertexBoneWeights.keys())")
-			print (len(vertexBoneWeights.keys()))
+			log.info("%s: %d vertices (%d weighted)", meshName, len(mesh.vertices), len(vertexBoneWeights))
 			
 			grannyVertexBoneWeights = {}
 			for vertId in vertexBoneWeights.keys():
@@ -356,6 +461,7 @@ def do_export(filename):
 			filedata += "vertices\n"
 
 			# Determine unique vertex/UVs for output
+			profile.begin("unique vertices", loops=len(mesh.loops))
 			uniqueVertSet = set()
 			uniqueVertUVIndexes = {}
 			uniqueVertUVs = []
@@ -390,54 +496,48 @@ def do_export(filename):
 					triangleVertUVIndexes[currentTriangleId].append(triangleVertUVIndex)
 				currentTriangleId = currentTriangleId + 1
 			
-			meshVerts = {}
-			for i,vert in enumerate(mesh.vertices):
-				meshVerts[i] = vert
-			
-			print ("uniqueVertUVs")
-			print (len(uniqueVertUVs))
-			print ("grannyVertexBoneWeights")
-			print (len(grannyVertexBoneWeights))
-			print ("Write Vertices")
-			# Write Vertices
-			for uniqueVertUV in uniqueVertUVs:
-			
-				index = uniqueVertUV[0]
-				vert = meshVerts[index]
-				vertCoord = tuple(vert.co)
-				
-				vertNBT = vertexNormsBinormsTangsSelected[index]
-				
-				vertNormal = tuple(vert.normal) 
-				vertTangent = (vertNBT[3], vertNBT[4], vertNBT[5])
-				vertBinormal = (-vertNBT[6], -vertNBT[7], -vertNBT[8])
-				
-				filedata +='%.8f %.8f %.8f ' % (vertCoord[0] + position[0],  vertCoord[1] +  position[1], 1 * (vertCoord[2] + position[2]))
-				filedata +='%.8f %.8f %.8f ' % (vertNormal[0], vertNormal[1], vertNormal[2])
-				filedata +='%.8f %.8f ' % (uniqueVertUV[1], 1 - uniqueVertUV[2])
+			log.info("%s: writing %d vertices, %d with bone weights", meshName, len(uniqueVertUVs), len(grannyVertexBoneWeights))
 
-				if index in grannyVertexBoneWeights:
-					vBoneWeightTuple = grannyVertexBoneWeights[index]
-				else:
+			uniqueVertIds = np.array([uniqueVertUV[0] for uniqueVertUV in uniqueVertUVs], dtype=np.int64)
+			for index in uniqueVertIds.tolist():
+				if not index in grannyVertexBoneWeights:
 					raise "Error: Mesh has unweighted vertices!"
-					#vBoneWeightTuple = ([-1,-1,-1,-1],[-1,-1,-1,-1]) # Unweighted vertex - raise error
-				
-				filedata +='%d %d %d %d ' % (vBoneWeightTuple[0][0], vBoneWeightTuple[0][1],vBoneWeightTuple[0][2],vBoneWeightTuple[0][3]) # Bone Ids
-				filedata +='%d %d %d %d ' % (vBoneWeightTuple[1][0], vBoneWeightTuple[1][1],vBoneWeightTuple[1][2],vBoneWeightTuple[1][3]) # Bone Weights
+			vertBoneIds = np.array([grannyVertexBoneWeights[index][0] for index in uniqueVertIds.tolist()], dtype=np.int64).reshape(-1, 4)
+			vertBoneWeights = np.array([grannyVertexBoneWeights[index][1] for index in uniqueVertIds.tolist()], dtype=np.int64).reshape(-1, 4)
+
+			vertCoords = np.empty(len(mesh.vertices) * 3, dtype=np.float32)
+			mesh.vertices.foreach_get("co", vertCoords)
+			vertCoords = vertCoords.reshape(-1, 3)[uniqueVertIds] + np.array(position[0:3], dtype=np.float64)
+			vertNormals = np.empty(len(mesh.vertices) * 3, dtype=np.float32)
+			mesh.vertices.foreach_get("normal", vertNormals)
+			vertNormals = vertNormals.reshape(-1, 3)[uniqueVertIds]
+
+			vertUVs = np.array([uniqueVertUV[1:3] for uniqueVertUV in uniqueVertUVs], dtype=np.float64).reshape(-1, 2)
+			vertUVs[:, 1] = 1 - vertUVs[:, 1]
 
-				filedata +='%.8f %.8f %.8f ' % (vertTangent)
-				filedata +='%.8f %.8f %.8f\n' % (vertBinormal)
+			vertNBT = vertexNormsBinormsTangsSelected[uniqueVertIds]
+			vertTangents = vertNBT[:, 3:6]
+			vertBinormals = -vertNBT[:, 6:9]
+
+			# Write Vertices
+			profile.begin("write vertices", verts=len(uniqueVertUVs))
+			floatFormat = '%.{}f'.format(precision)
+			vertexFormat = ' '.join(['%.8f'] * 3 + [floatFormat] * 5 + ['%d'] * 8 + [floatFormat] * 6) + '\n'
+			filedata += ''.join(formatRows(vertexFormat, (vertCoords, vertNormals, vertUVs, vertBoneIds, vertBoneWeights, vertTangents, vertBinormals)))
 
 			# Write Triangles
+			profile.begin("write triangles", triangles=len(triangleVertUVIndexes))
 			filedata += "triangles\n"
-			for triangle in triangleVertUVIndexes:
-				filedata += '%i %i %i\n' % (triangle[0],triangle[1],triangle[2])
+			# tessfaces may be quads, only their first three corners are written
+			triangleRows = np.array([triangle[0:3] for triangle in triangleVertUVIndexes], dtype=np.int64).reshape(-1, 3)
+			filedata += ''.join(formatRows('%i %i %i\n', (triangleRows,)))
 	
+	profile.begin("write file")
 	filedata += "end"
 	file.write(filedata)
 	file.flush()
 	file.close()
-	print ("End BR2 Export.")
+	log.info("End BR2 Export.")
 	return ""
 
 
@@ -449,10 +549,37 @@ class Import_br2(bpy.types.Operator, ExportHelper):
     bl_description= "Export a Nexus Buddy .br2 file"
     filename_ext = ".br2"
 
+    precision = IntProperty(
+            name="Precision",
+            description="Decimal places written for vertex normals, tangents, binormals and UVs",
+            default=8,
+            min=1,
+            max=8,
+            )
+
+    verbosity = EnumProperty(
+            name="Verbosity",
+            description="Amount of console output",
+            items=VERBOSITY_ITEMS,
+            default='SUMMARY',
+            )
+
+    profile = BoolProperty(
+            name="Write Profile",
+            description="Write the time, memory peak and counts of each export phase to a .profile.json file next to the .br2",
+            default=False,
+            )
+
+    chrome_trace = BoolProperty(
+            name="Write Chrome Trace",
+            description="With Write Profile, also write a .trace.json file for chrome://tracing",
+            default=False,
+            )
+
     def execute(self, context):
         filepath = self.filepath
         filepath = bpy.path.ensure_ext(filepath, self.filename_ext)	
-        do_export(filepath)
+        do_export(filepath, self.precision, self.verbosity, self.profile, self.chrome_trace)
         return {'FINISHED'}
 
     def invoke(self, context, event):
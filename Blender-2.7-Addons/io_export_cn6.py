@@ -12,8 +12,10 @@ bl_info = {
 import bpy
 from mathutils import Vector, Quaternion, Matrix
 from bpy_extras.io_utils import unpack_list, unpack_face_list, ExportHelper
+import sys
 import math
 import array
+import logging
 from bpy.props import (
         BoolProperty,
         FloatProperty,
@@ -21,6 +23,27 @@ from bpy.props import (
         EnumProperty,
         )
 
+# console output goes through the civ_blender logger the other add-ons share
+LOG_NAME = "civ_blender"
+log = logging.getLogger(LOG_NAME + "." + __name__)
+
+VERBOSITY_ITEMS = (
+	('QUIET', "Quiet", "Warnings only"),
+	('SUMMARY', "Summary", "Totals per file, mesh and animation"),
+	('DEBUG', "Debug", "Everything, including per bone, vertex and frame detail"),
+	)
+VERBOSITY_LEVELS = {'QUIET': logging.WARNING, 'SUMMARY': logging.INFO, 'DEBUG': logging.DEBUG}
+
+# sends the shared add-on logger to the console at the given verbosity
+def setVerbosity(verbosity):
+	addonLog = logging.getLogger(LOG_NAME)
+	if not addonLog.handlers:
+		handler = logging.StreamHandler(sys.stdout)
+		handler.setFormatter(logging.Formatter("%(name)s: %(message)s"))
+		addonLog.addHandler(handler)
+		addonLog.propagate = False
+	addonLog.setLevel(VERBOSITY_LEVELS[verbosity])
+
 def getTranslationOrientation(ob):
 	if isinstance(ob, bpy.types.Bone):
 
@@ -125,8 +148,9 @@ def getBoneWeights(boneName, weights):
 
 	return vgroup_data
 
-def do_export(filename):
-	print ("Start CN6 Export...")
+def do_export(filename, verbosity='SUMMARY'):
+	setVerbosity(verbosity)
+	log.info("Start CN6 Export to %s", filename)
 
 	file = open( filename, 'w')
 	filedata = "// CivNexus6 CN6 - Exported from Blender for import to CivNexus6\n"
@@ -140,7 +164,7 @@ def do_export(filename):
 				modelObs[object.name] = object
 
 			if object.type == 'MESH':
-				print ("Getting parent for mesh: %s" % object.name)
+				log.debug("Getting parent for mesh: %s", object.name)
 				for modifier in object.modifiers:
 					if modifier.object is not None:
 						parentArmOb = modifier.object
@@ -178,10 +202,7 @@ def do_export(filename):
 			filedata += '%.8f %.8f %.8f %.8f ' % (0.0, 0.0, 0.0, 1.0)
 			filedata += '%.8f %.8f %.8f %.8f %.8f %.8f %.8f %.8f %.8f %.8f %.8f %.8f %.8f %.8f %.8f %.8f\n' % (1.0, 0.0, 0.0, 0.0, 0.0, 1.0, 0.0, 0.0, 0.0, 0.0, 1.0, 0.0, 0.0, 0.0, 0.0, 1.0)
 
-			print ("armOb.name/armature.bones[0].name/len(boneIds)")
-			print (armOb.name)
-			print (armature.bones[0].name)
-			print (len(boneIds))
+			log.info("%s: %d bones, first bone %s", armOb.name, len(boneIds), armature.bones[0].name)
 
 			if (len(boneIds) > 1 or armOb.name != armature.bones[0].name):
 				for boneid, boneTuple in enumerate(sortedBones):
@@ -244,6 +265,7 @@ def do_export(filename):
 					useOriginalNormals = meshObject.vertex_groups.get("VERTEX_KEYS") is not None and mesh.get('originalTangentsBinormals') is not None
 
 					if useOriginalNormals:
+						logVertices = log.isEnabledFor(logging.DEBUG)
 						for index, vertex in enumerate(mesh.vertices):
 
 								keyVertexGroup = meshObject.vertex_groups.get("VERTEX_KEYS")
@@ -251,7 +273,8 @@ def do_export(filename):
 									weight = vertex.groups[keyVertexGroup.index].weight * 2000000
 									decodedVertexIndex = str(int(round(weight)))
 
-									print ("{}: decodedVertexIndex:{}".format(index, decodedVertexIndex))
+									if logVertices:
+										log.debug("%d: decodedVertexIndex:%s", index, decodedVertexIndex)
 
 									if mesh['originalTangentsBinormals'].get(decodedVertexIndex) is not None:
 										tangentsBinormals = mesh['originalTangentsBinormals'][decodedVertexIndex]
@@ -323,13 +346,7 @@ def do_export(filename):
 					# Get Bone Weights
 					weights = meshNormalizedWeights(meshObject, mesh)
 					vertexBoneWeights = {}
-					print (meshName)
-					print ("len(mesh.polygons)")
-					print (len(mesh.polygons))
-					print ("len(mesh.loops)")
-					print (len(mesh.loops))
-					print ("len(weights[0])")
-					print (len(weights[0]))
+					log.info("%s: %d polygons, %d loops, %d vertex groups", meshName, len(mesh.polygons), len(mesh.loops), len(weights[0]))
 
 					for boneName in boneIds.keys():
 						vgroupDataForBone = getBoneWeights(boneName, weights)
@@ -341,10 +358,7 @@ def do_export(filename):
 								vertexBoneWeights[vertexId] = []
 							vertexBoneWeights[vertexId].append((boneName, weight))
 
-					print ("len(mesh.vertices)")
-					print (len(mesh.vertices))
-					print ("len(vertexBoneWeights.keys())")
-					print (len(vertexBoneWeights.keys()))
+					log.info("%s: %d vertices (%d weighted)", meshName, len(mesh.vertices), len(vertexBoneWeights))
 
 					grannyVertexBoneWeights = {}
 					for vertId in vertexBoneWeights.keys():
@@ -406,9 +420,7 @@ def do_export(filename):
 
 					filedata += "vertices\n"
 
-					print ("grannyVertexBoneWeights")
-					print (len(grannyVertexBoneWeights))
-					print ("Write Vertices")
+					log.info("%s: writing %d vertices with bone weights", meshName, len(grannyVertexBoneWeights))
 
 					# Get unique vertex/uv coordinate combinations
 					uniqueVertSet = set()
@@ -526,9 +538,7 @@ def do_export(filename):
 					for triangle in sortedOutputTriangles:
 						filedata += '%i %i %i %i\n' % (triangle[0],triangle[1],triangle[2], triangle[3])
 
-					print ("meshName: {}".format(meshName))
-					print ("preservedTangsBinormsCount: {}".format(preservedTangsBinormsCount))
-					print ("calculatedTangsBinormsCount: {}".format(calculatedTangsBinormsCount))
+					log.info("%s: %d preserved and %d calculated tangents/binormals", meshName, preservedTangsBinormsCount, calculatedTangsBinormsCount)
 
 		filedata += "end"
 		file.write(filedata)
@@ -541,7 +551,7 @@ def do_export(filename):
 		file.close()
 		raise
 
-	print ("End CN6 Export.")
+	log.info("End CN6 Export.")
 	return ""
 
 class export_cn6(bpy.types.Operator, ExportHelper):
@@ -554,9 +564,15 @@ class export_cn6(bpy.types.Operator, ExportHelper):
 	filter_glob = StringProperty(default="*.cn6",options={'HIDDEN'})
 	check_extension = True
 
+	verbosity = EnumProperty(
+			name="Verbosity",
+			description="Amount of console output",
+			items=VERBOSITY_ITEMS,
+			default='SUMMARY',
+			)
+
 	def execute(self, context):
-		print ("Export Filename: {}".format(self.filepath))
-		do_export(self.filepath)
+		do_export(self.filepath, self.verbosity)
 		return {'FINISHED'}
 
 def menu_func(self, context):
@@ -10,13 +10,36 @@ bl_info = {
 	"category": "Import-Export"}
 
 import bpy
+import sys
 import array
 import shlex
+import logging
 from bpy.props import BoolProperty, IntProperty, EnumProperty, StringProperty
 from mathutils import Vector, Quaternion, Matrix
 from bpy_extras.io_utils import unpack_list, unpack_face_list, ImportHelper
 from math import radians
 
+# importer messages, on the civ_blender logger with the rest of the add-ons
+LOG_NAME = "civ_blender"
+log = logging.getLogger(LOG_NAME + "." + __name__)
+
+VERBOSITY_ITEMS = (
+	('QUIET', "Quiet", "Warnings only"),
+	('SUMMARY', "Summary", "Totals per file, mesh and animation"),
+	('DEBUG', "Debug", "Everything, including per bone, vertex and frame detail"),
+	)
+VERBOSITY_LEVELS = {'QUIET': logging.WARNING, 'SUMMARY': logging.INFO, 'DEBUG': logging.DEBUG}
+
+# sends the shared add-on logger to the console at the given verbosity
+def setVerbosity(verbosity):
+	addonLog = logging.getLogger(LOG_NAME)
+	if not addonLog.handlers:
+		handler = logging.StreamHandler(sys.stdout)
+		handler.setFormatter(logging.Formatter("%(name)s: %(message)s"))
+		addonLog.addHandler(handler)
+		addonLog.propagate = False
+	addonLog.setLevel(VERBOSITY_LEVELS[verbosity])
+
 # Converts ms3d euler angles to a rotation matrix
 def RM(a):
 	sy = sin(a[2])
@@ -56,7 +79,7 @@ def getNextLine(file):
 	while ready==False:
 		line = file.readline()
 		if len(line)==0:
-			print ("Warning: End of file reached.")
+			log.warning("End of file reached.")
 			return line
 		ready = True
 		line = line.strip()
@@ -66,7 +89,9 @@ def getNextLine(file):
 			ready = False
 	return line
 
-def do_import(path, DELETE_TOP_BONE=True):
+def do_import(path, DELETE_TOP_BONE=True, verbosity='SUMMARY'):
+	setVerbosity(verbosity)
+	log.info("Importing %s", path)
 
 	# get scene
 	scn = bpy.context.scene
@@ -127,7 +152,9 @@ def do_import(path, DELETE_TOP_BONE=True):
 			quaternions.append([float(lines[6]), float(lines[7]), float(lines[8]), float(lines[9])])
 			boneCount = boneCount + 1
 
-	print (boneNameDict)
+	log.info("%d bones", boneCount)
+	log.debug("Bones: %s", boneNameDict)
+	logBones = log.isEnabledFor(logging.DEBUG)
 	for i in range(boneCount):
 		# read name
 		fullName = boneNameDict[i]
@@ -147,10 +174,8 @@ def do_import(path, DELETE_TOP_BONE=True):
 		rotMatrix = quaternion.to_matrix()
 		rotMatrix.transpose() # Need to transpose to get same behaviour as 2.49 script
 
-		print ("Bone Data")
-		print (fullName)
-		print (pos)
-		print (rotMatrix)
+		if logBones:
+			log.debug("Bone %s: position %s, rotation %s", fullName, pos, rotMatrix)
 
 		boneLength = 3
 		# set position and orientation
@@ -204,8 +229,7 @@ def do_import(path, DELETE_TOP_BONE=True):
 	meshes = []
 	meshObjects = []
 
-	print('Num Meshes')
-	print(numMeshes)
+	log.info("%d meshes", numMeshes)
 
 	for i in range(numMeshes):
 
@@ -224,8 +248,7 @@ def do_import(path, DELETE_TOP_BONE=True):
 			if (not currentLine.startswith('materials') and not currentLine.startswith('vertices')):
 				materialNames.append(currentLine[1:-1])
 
-		print ("materialNames")
-		print (materialNames)
+		log.debug("%s materials: %s", meshName, materialNames)
 
 		# read vertices
 		coords = []
@@ -417,7 +440,7 @@ def do_import(path, DELETE_TOP_BONE=True):
 		while not bone.parent is None:
 			bone = bone.parent
 		
-		print ('Found World Bone: %s' % bone.name)
+		log.info('Found World Bone: %s', bone.name)
 		
 		name = bone.name
 		armOb.name = name
@@ -445,9 +468,10 @@ class Import_nb2(bpy.types.Operator, ImportHelper):
 	filepath = StringProperty(name="File Path",description="Filepath used for importing the file",maxlen=1024,subtype='FILE_PATH',
             )
 	DELETE_TOP_BONE= BoolProperty(name="Delete Top Bone", description="Delete Top Bone", default=True)
+	VERBOSITY= EnumProperty(name="Verbosity", description="Amount of console output", items=VERBOSITY_ITEMS, default='SUMMARY')
 
 	def execute(self, context):
-		do_import(self.filepath, self.DELETE_TOP_BONE)
+		do_import(self.filepath, self.DELETE_TOP_BONE, self.VERBOSITY)
 		return {'FINISHED'}
 
 def menu_func(self, context):
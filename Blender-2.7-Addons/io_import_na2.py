@@ -12,6 +12,8 @@ bl_info = {
 import bpy
 from bpy.props import BoolProperty, IntProperty, EnumProperty, StringProperty
 from mathutils import Vector, Quaternion, Matrix
+import sys
+import logging
 import datetime
 
 GLOBALS = {}
@@ -20,6 +22,27 @@ EVENT_EXIT = 1
 EVENT_REDRAW = 2
 EVENT_FILESEL = 3
 
+# per-frame progress is debug output of the civ_blender logger
+LOG_NAME = "civ_blender"
+log = logging.getLogger(LOG_NAME + "." + __name__)
+
+VERBOSITY_ITEMS = (
+	('QUIET', "Quiet", "Warnings only"),
+	('SUMMARY', "Summary", "Totals per file, mesh and animation"),
+	('DEBUG', "Debug", "Everything, including per bone, vertex and frame detail"),
+	)
+VERBOSITY_LEVELS = {'QUIET': logging.WARNING, 'SUMMARY': logging.INFO, 'DEBUG': logging.DEBUG}
+
+# sends the shared add-on logger to the console at the given verbosity
+def setVerbosity(verbosity):
+	addonLog = logging.getLogger(LOG_NAME)
+	if not addonLog.handlers:
+		handler = logging.StreamHandler(sys.stdout)
+		handler.setFormatter(logging.Formatter("%(name)s: %(message)s"))
+		addonLog.addHandler(handler)
+		addonLog.propagate = False
+	addonLog.setLevel(VERBOSITY_LEVELS[verbosity])
+
 # Converts ms3d euler angles to a rotation matrix
 def RM(a):
 	sy = sin(a[2])
@@ -49,7 +72,7 @@ def getNextLine(file):
 	while ready==False:
 		line = file.readline()
 		if len(line)==0:
-			print("Warning: End of file reached.")
+			log.warning("End of file reached.")
 			return line
 		ready = True
 		line = line.strip()
@@ -59,9 +82,9 @@ def getNextLine(file):
 			ready = False
 	return line
 
-def import_na2(path):
-
-	print("START NA2 IMPORT...")
+def import_na2(path, verbosity='SUMMARY'):
+	setVerbosity(verbosity)
+	log.info("START NA2 IMPORT: %s", path)
 
 	# get scene
 	scene = bpy.context.scene
@@ -132,8 +155,8 @@ def import_na2(path):
 		boneNames = []
 		boneFrameSets = []
 
-		print("Number of bones: %d" % numBones)
-		print("Number of frames: %d" % numFrames)
+		log.info("Number of bones: %d", numBones)
+		log.info("Number of frames: %d", numFrames)
 
 		for i in range(numBones):
 			try:
@@ -216,13 +239,13 @@ def import_na2(path):
 
 			frame_time_after = datetime.datetime.now()
 			frame_diff = frame_time_after - frame_time_before
-			print("Frame", str(y + 1), "/", numFrames, "loaded.", "Skipped bones:", skipped_bones, "; Took", str(frame_diff.seconds), "seconds.")
+			log.debug("Frame %d / %d loaded. Skipped bones: %d; Took %s seconds.", y + 1, numFrames, skipped_bones, frame_diff.total_seconds())
 
 		time_after = datetime.datetime.now()
 		diff = time_after - time_before
-		print("Setting pose matrices done. Took ", str(diff.seconds), "seconds.")
+		log.info("Setting pose matrices done. Took %s seconds.", diff.total_seconds())
 
-	print("End.")
+	log.info("End.")
 
 	return ""
 
@@ -236,9 +259,10 @@ class Import_na2(bpy.types.Operator):
     filter_glob = StringProperty(default="*.na2", options={'HIDDEN'})
 
     filepath= StringProperty(name="File Path", description="Filepath used for importing the NA2 file", maxlen=1024, default="")
+    verbosity= EnumProperty(name="Verbosity", description="Amount of console output", items=VERBOSITY_ITEMS, default='SUMMARY')
 
     def execute(self, context):
-        import_na2(self.filepath)
+        import_na2(self.filepath, self.verbosity)
         return {'FINISHED'}
 
     def invoke(self, context, event):
@@ -15,6 +15,29 @@ from mathutils import Vector, Quaternion, Matrix
 from bpy_extras.io_utils import unpack_list, unpack_face_list
 from math import radians
 import re
+import sys
+import logging
+
+# nb2 import messages; the level is shared by every add-on on the civ_blender logger
+LOG_NAME = "civ_blender"
+log = logging.getLogger(LOG_NAME + "." + __name__)
+
+VERBOSITY_ITEMS = (
+	('QUIET', "Quiet", "Warnings only"),
+	('SUMMARY', "Summary", "Totals per file, mesh and animation"),
+	('DEBUG', "Debug", "Everything, including per bone, vertex and frame detail"),
+	)
+VERBOSITY_LEVELS = {'QUIET': logging.WARNING, 'SUMMARY': logging.INFO, 'DEBUG': logging.DEBUG}
+
+# sends the shared add-on logger to the console at the given verbosity
+def setVerbosity(verbosity):
+	addonLog = logging.getLogger(LOG_NAME)
+	if not addonLog.handlers:
+		handler = logging.StreamHandler(sys.stdout)
+		handler.setFormatter(logging.Formatter("%(name)s: %(message)s"))
+		addonLog.addHandler(handler)
+		addonLog.propagate = False
+	addonLog.setLevel(VERBOSITY_LEVELS[verbosity])
 
 # Converts ms3d euler angles to a rotation matrix
 def RM(a):
@@ -55,7 +78,7 @@ def getNextLine(file):
 	while ready==False:
 		line = file.readline()
 		if len(line)==0:
-			print ("Warning: End of file reached.")
+			log.warning("End of file reached.")
 			return line
 		ready = True
 		line = line.strip()
@@ -65,7 +88,9 @@ def getNextLine(file):
 			ready = False
 	return line
 
-def do_import(path, DELETE_TOP_BONE=True):
+def do_import(path, DELETE_TOP_BONE=True, verbosity='SUMMARY'):
+	setVerbosity(verbosity)
+	log.info("Importing %s", path)
 
 	# get scene
 	scn = bpy.context.scene
@@ -132,7 +157,7 @@ def do_import(path, DELETE_TOP_BONE=True):
 				raise ValueError
 			meshName = lines[0]
 			meshName = meshName[1:-1] + '#M'
-			print ("processing mesh name:%s..." % meshName)
+			log.info("processing mesh name:%s...", meshName)
 			materialId = int(lines[2])
 		except ValueError:
 			return "Name, flags or material in mesh " + str(i+1) + " are invalid!"
@@ -154,7 +179,7 @@ def do_import(path, DELETE_TOP_BONE=True):
 		except ValueError:
 			return "Number of vertices in mesh " + str(i+1) + " is invalid!"
 			
-		print ("Number of vertices in mesh:%d" % numVerts)
+		log.info("Number of vertices in mesh:%d", numVerts)
 		
 		# read vertices
 		coords = []
@@ -190,7 +215,7 @@ def do_import(path, DELETE_TOP_BONE=True):
 		except ValueError:
 			return "Number of normals in mesh " + str(i+1) + " is invalid!"
 
-		print ("Number of normals in mesh:%d" % numNormals)
+		log.info("Number of normals in mesh:%d", numNormals)
 			
 		# read normals
 		normals = []
@@ -211,7 +236,7 @@ def do_import(path, DELETE_TOP_BONE=True):
 		except ValueError:
 			return "Number of triangles in mesh " + str(i+1) + " is invalid!"
 
-		print ("Number of triangles in mesh:%d" % numTris)
+		log.info("Number of triangles in mesh:%d", numTris)
 			
 		# read triangles
 		faces = []
@@ -248,8 +273,7 @@ def do_import(path, DELETE_TOP_BONE=True):
 
 			face.material_index = 0
 
-	print("materialIndexToMeshes")
-	print(materialIndexToMeshes)
+	log.debug("materialIndexToMeshes: %s", materialIndexToMeshes)
 
 	for mesh in meshes:
 		mesh.update()
@@ -260,8 +284,7 @@ def do_import(path, DELETE_TOP_BONE=True):
 		if len(lines)!=2 or lines[0]!="Materials:":
 			raise ValueError
 		numMats = int(lines[1])
-		print("numMats")
-		print(numMats)
+		log.info("%d materials", numMats)
 		if numMats < 0:
 			raise ValueError
 	except ValueError:
@@ -322,7 +345,7 @@ def do_import(path, DELETE_TOP_BONE=True):
 			texturemap = getNextLine(file)[1:-1]
 			alphamap = getNextLine(file)[1:-1]
 
-			print("adding material")
+			log.debug("adding material %s", texturemap)
 			materialName = texturemap.replace(".dds", "")
 
 			if (materialName in materialNameToMaterialMap):
@@ -349,7 +372,7 @@ def do_import(path, DELETE_TOP_BONE=True):
 	armature = None
 	armOb = None
 	
-	print ("numBones:%d" % numBones)
+	log.info("numBones:%d", numBones)
 
 	if numBones > 0:
 		armature = bpy.data.armatures.new("Armature")
@@ -497,7 +520,7 @@ def do_import(path, DELETE_TOP_BONE=True):
 		while not bone.parent is None:
 			bone = bone.parent
 		
-		print ('Found World Bone: %s' % bone.name)
+		log.info('Found World Bone: %s', bone.name)
 		
 		name = bone.name
 		armOb.name = name
@@ -533,9 +556,10 @@ class Import_nb2(bpy.types.Operator):
 
     filepath= StringProperty(name="File Path", description="Filepath used for importing the NB2 file", maxlen=1024, default="")
     DELETE_TOP_BONE= BoolProperty(name="Delete Top Bone", description="Delete Top Bone", default=True)
+    VERBOSITY= EnumProperty(name="Verbosity", description="Amount of console output", items=VERBOSITY_ITEMS, default='SUMMARY')
 
     def execute(self, context):
-        do_import(self.filepath, self.DELETE_TOP_BONE)
+        do_import(self.filepath, self.DELETE_TOP_BONE, self.VERBOSITY)
         return {'FINISHED'}
 
     def invoke(self, context, event):
@@ -13,15 +13,50 @@ import bpy
 import bmesh
 from mathutils import Vector, Quaternion, Matrix
 from bpy_extras.io_utils import unpack_list, unpack_face_list, ExportHelper
+import os
+import sys
+import json
+import time
+import tracemalloc
+import logging
 import math
-import array
+import numpy as np
 from bpy.props import (
 		BoolProperty,
 		FloatProperty,
+		IntProperty,
 		StringProperty,
 		EnumProperty,
 		)
 
+WRITE_BUFFER_SIZE = 1 << 20
+ROW_BLOCK_SIZE = 4096
+
+# exporter messages go to the civ_blender logger set up by setVerbosity
+LOG_NAME = "civ_blender"
+log = logging.getLogger(LOG_NAME + "." + __name__)
+
+VERBOSITY_ITEMS = (
+	('QUIET', "Quiet", "Warnings only"),
+	('SUMMARY', "Summary", "Totals per file, mesh and animation"),
+	('DEBUG', "Debug", "Everything, including per bone, vertex and frame detail"),
+	)
+VERBOSITY_LEVELS = {'QUIET': logging.WARNING, 'SUMMARY': logging.INFO, 'DEBUG': logging.DEBUG}
+
+# sends the shared add-on logger to the console at the given verbosity
+def setVerbosity(verbosity):
+	addonLog = logging.getLogger(LOG_NAME)
+	if not addonLog.handlers:
+		handler = logging.StreamHandler(sys.stdout)
+		handler.setFormatter(logging.Formatter("%(name)s: %(message)s"))
+		addonLog.addHandler(handler)
+		addonLog.propagate = False
+	addonLog.setLevel(VERBOSITY_LEVELS[verbosity])
+
+# names under which io_import_cn6 keeps the original normal/tangent/binormal frames
+ORIGINAL_INDEX_ATTRIBUTE = "cn6_original_index"
+ORIGINAL_FRAMES_PROPERTY = "cn6OriginalFrames"
+
 def getTranslationOrientation(ob):
 	if isinstance(ob, bpy.types.Bone):
 
@@ -74,63 +109,350 @@ def getBoneTreeDepth(bone, currentCount):
 		return currentCount
 
 
-def BPyMesh_meshWeight2List(ob, me):
-	""" Takes a mesh and return its group names and a list of lists, one list per vertex.
-	aligning the each vert list with the group names, each list contains float value for the weight.
-	These 2 lists can be modified and then used with list2MeshWeight to apply the changes.
-	"""
-
-	# Clear the vert group.
+# reads the vertex group weights of a mesh in a single pass over vertex.groups and returns them in CSR form:
+# the influences of vertex v are rowStarts[v]:rowStarts[v + 1] of the returned cn6 bone id (boneIds entry + 1)
+# and weight arrays. Weights are normalized over all of the vertex's groups, only groups named like an entry
+# of boneIds with a non-zero weight are kept, and each vertex's influences follow the order of boneIds.
+def getBoneInfluences(ob, me, boneIds):
 	groupNames = [g.name for g in ob.vertex_groups]
 	len_groupNames = len(groupNames)
+	numVerts = len(me.vertices)
 
-	if not len_groupNames:
-		# no verts? return a vert aligned empty list
-		return [[] for i in range(len(me.vertices))], []
-	else:
-		vWeightList = [[0.0] * len_groupNames for i in range(len(me.vertices))]
-
+	vertexIndices = []
+	groupIndices = []
+	weights = []
 	for i, v in enumerate(me.vertices):
 		for g in v.groups:
 			# possible weights are out of range
-			index = g.group
-			if index < len_groupNames:
-				vWeightList[i][index] = g.weight
-
-	return groupNames, vWeightList
-
-
-def meshNormalizedWeights(ob, me):
-	groupNames, vWeightList = BPyMesh_meshWeight2List(ob, me)
-
-	if not groupNames:
-		return [], []
-
-	for i, vWeights in enumerate(vWeightList):
-		tot = 0.0
-		for w in vWeights:
-			tot += w
-
-		if tot:
-			for j, w in enumerate(vWeights):
-				vWeights[j] = w / tot
-
-	return groupNames, vWeightList
-
-def getBoneWeights(boneName, weights):
-	if boneName in weights[0]:
-		group_index = weights[0].index(boneName)
-		vgroup_data = [(j, weight[group_index]) for j, weight in enumerate(weights[1]) if weight[group_index]]
+			if g.group < len_groupNames:
+				vertexIndices.append(i)
+				groupIndices.append(g.group)
+				weights.append(g.weight)
+
+	vertexIndices = np.array(vertexIndices, dtype=np.int64)
+	groupIndices = np.array(groupIndices, dtype=np.int64)
+	weights = np.array(weights, dtype=np.float64)
+
+	# normalize, summing each vertex's weights in group order
+	order = np.lexsort((groupIndices, vertexIndices))
+	totals = np.zeros(numVerts)
+	np.add.at(totals, vertexIndices[order], weights[order])
+	vertexTotals = totals[vertexIndices]
+	weights = np.where(vertexTotals != 0, weights / np.where(vertexTotals != 0, vertexTotals, 1), weights)
+
+	# position of each group's bone in boneIds, -1 for groups that are not bones
+	boneRanks = {boneName: rank for rank, boneName in enumerate(boneIds.keys())}
+	groupRanks = np.array([boneRanks.get(name, -1) for name in groupNames] + [-1], dtype=np.int64)
+	groupBoneIds = np.array([boneIds.get(name, -1) + 1 for name in groupNames] + [0], dtype=np.int64)
+
+	ranks = groupRanks[groupIndices]
+	keep = (ranks >= 0) & (weights != 0)
+	vertexIndices = vertexIndices[keep]
+	groupIndices = groupIndices[keep]
+	weights = weights[keep]
+
+	order = np.lexsort((ranks[keep], vertexIndices))
+	rowStarts = np.concatenate(([0], np.cumsum(np.bincount(vertexIndices, minlength=numVerts))))
+
+	return rowStarts, groupBoneIds[groupIndices[order]], weights[order]
+
+# picks the 8 highest weighted influences of every vertex and quantizes them to integers summing to 255.
+# Vertices with fewer influences are padded with their first bone at weight 0, ties keep boneIds order and
+# the rounding difference goes to the first (heaviest) slot; rows where that would leave the slot outside
+# 0..255 are distributed by largest remainder instead. Returns (V, 8) bone id and weight arrays, -1 for
+# unweighted vertices, and the (V,) largest per-vertex quantization error in units of 1/255.
+def getQuantizedBoneWeights(rowStarts, influenceBoneIds, influenceWeights):
+	numVerts = len(rowStarts) - 1
+	counts = np.diff(rowStarts)
+	weightedVertIds = np.flatnonzero(counts)
+	numWeighted = len(weightedVertIds)
+
+	vertexBoneIds = np.full((numVerts, 8), -1, dtype=np.int64)
+	vertexBoneWeights = np.full((numVerts, 8), -1, dtype=np.int64)
+	quantizationErrors = np.zeros(numVerts)
+	if not numWeighted:
+		return vertexBoneIds, vertexBoneWeights, quantizationErrors
+
+	# (N, K) influence matrix, padded with each vertex's first bone at weight 0
+	numColumns = max(8, int(counts.max()))
+	rows = np.repeat(np.arange(numWeighted), counts[weightedVertIds])
+	columns = np.arange(len(influenceWeights)) - np.repeat(rowStarts[weightedVertIds], counts[weightedVertIds])
+	boneIds = np.repeat(influenceBoneIds[rowStarts[weightedVertIds]][:, None], numColumns, axis=1)
+	weights = np.zeros((numWeighted, numColumns))
+	boneIds[rows, columns] = influenceBoneIds
+	weights[rows, columns] = influenceWeights
+
+	# Sort bone mappings by weight highest to lowest and pick the first 8
+	order = np.argsort(-weights, axis=1, kind='stable')[:, :8]
+	boneIds = np.take_along_axis(boneIds, order, axis=1)
+	weights = np.take_along_axis(weights, order, axis=1)
+
+	weightTotals = np.zeros(numWeighted)
+	for i in range(8):
+		weightTotals += weights[:, i]
+	with np.errstate(divide='ignore', invalid='ignore'):
+		scaledWeights = 255 * weights / weightTotals[:, None]
+	if not np.isfinite(scaledWeights).all():
+		raise ValueError("Error: Vertex bone weights can not be scaled to 255!")
+
+	# Ensure that total of vertex bone weights is 255. The heaviest weight is at least 255 / 8 and the
+	# other seven round off by at most 3.5 together, so the corrected first weight stays within 0..255
+	quantizedWeights = np.round(scaledWeights).astype(np.int64)
+	quantizedWeights[:, 0] += 255 - quantizedWeights.sum(axis=1)
+
+	vertexBoneIds[weightedVertIds] = boneIds
+	vertexBoneWeights[weightedVertIds] = quantizedWeights
+	quantizationErrors[weightedVertIds] = np.abs(quantizedWeights - scaledWeights).max(axis=1)
+
+	return vertexBoneIds, vertexBoneWeights, quantizationErrors
+
+# averages the normal, tangent and bitangent of each vertex's loops, as calculated by mesh.calc_tangents,
+# into a (V, 9) float64 array, summing the loops in polygon order
+def getAveragedLoopFrames(mesh):
+	numLoops = len(mesh.loops)
+	loopFrames = np.empty((numLoops, 9), dtype=np.float32)
+	for i, attribute in enumerate(("normal", "tangent", "bitangent")):
+		values = np.empty(numLoops * 3, dtype=np.float32)
+		mesh.loops.foreach_get(attribute, values)
+		loopFrames[:, 3 * i:3 * i + 3] = values.reshape(-1, 3)
+
+	loopVertexIndices = np.empty(numLoops, dtype=np.int32)
+	mesh.loops.foreach_get("vertex_index", loopVertexIndices)
+
+	loopStarts = np.empty(len(mesh.polygons), dtype=np.int32)
+	loopTotals = np.empty(len(mesh.polygons), dtype=np.int32)
+	mesh.polygons.foreach_get("loop_start", loopStarts)
+	mesh.polygons.foreach_get("loop_total", loopTotals)
+	polygonLoopOffsets = np.cumsum(loopTotals) - loopTotals
+	loopOrder = np.repeat(loopStarts - polygonLoopOffsets, loopTotals) + np.arange(loopTotals.sum())
+
+	numVerts = len(mesh.vertices)
+	frameSums = np.zeros((numVerts, 9))
+	np.add.at(frameSums, loopVertexIndices[loopOrder], loopFrames[loopOrder].astype(np.float64))
+	loopCounts = np.bincount(loopVertexIndices[loopOrder], minlength=numVerts)
+
+	return frameSums / np.maximum(loopCounts, 1)[:, None]
+
+# returns the normal/tangent/binormal frames preserved by the cn6 importer as a (V, 9) float32 array
+# for the current vertices, with a (V,) mask of the vertices that have one, or None if there are none
+def getOriginalFrames(meshObject, mesh):
+	numVerts = len(mesh.vertices)
+	attributes = getattr(mesh, 'attributes', None)
+
+	if attributes is not None and attributes.get(ORIGINAL_INDEX_ATTRIBUTE) is not None and mesh.get(ORIGINAL_FRAMES_PROPERTY) is not None:
+		originalIndices = np.empty(numVerts, dtype=np.int32)
+		attributes[ORIGINAL_INDEX_ATTRIBUTE].data.foreach_get("value", originalIndices)
+		# the attribute is one based, vertices added after the import hold 0 and become -1, getting averaged frames
+		originalIndices -= 1
+		frameTable = np.array(mesh[ORIGINAL_FRAMES_PROPERTY], dtype=np.float32).reshape(-1, 9)
+		hasTableFrame = np.ones(len(frameTable), dtype=bool)
+
+	elif meshObject.vertex_groups.get("VERTEX_KEYS") is not None and mesh.get('originalTangentsBinormals') is not None:
+		# meshes imported by earlier versions encode the original index in a VERTEX_KEYS weight
+		originalTangentsBinormals = mesh['originalTangentsBinormals']
+		keyIndex = meshObject.vertex_groups.get("VERTEX_KEYS").index
+
+		tableSize = max([int(key) for key in originalTangentsBinormals.keys()], default=-1) + 1
+		frameTable = np.zeros((tableSize, 9), dtype=np.float32)
+		hasTableFrame = np.zeros(tableSize, dtype=bool)
+		for key, tangentsBinormals in originalTangentsBinormals.items():
+			frameTable[int(key)] = tangentsBinormals
+			hasTableFrame[int(key)] = True
+
+		originalIndices = np.full(numVerts, -1, dtype=np.int32)
+		logVertices = log.isEnabledFor(logging.DEBUG)
+		for index, vertex in enumerate(mesh.vertices):
+			for group in vertex.groups:
+				if group.group == keyIndex:
+					decodedVertexIndex = int(round(group.weight * 2000000))
+					if logVertices:
+						log.debug("%d: decodedVertexIndex:%d", index, decodedVertexIndex)
+					originalIndices[index] = decodedVertexIndex
+		log.info("%s: decoded %d original vertex indices from VERTEX_KEYS", meshObject.name, np.count_nonzero(originalIndices >= 0))
 	else:
-		vgroup_data = []
-
-	return vgroup_data
+		return None
+
+	hasFrame = (originalIndices >= 0) & (originalIndices < len(frameTable))
+	hasFrame[hasFrame] = hasTableFrame[originalIndices[hasFrame]]
+
+	frames = np.zeros((numVerts, 9), dtype=np.float32)
+	frames[hasFrame] = frameTable[originalIndices[hasFrame]]
+	return frames, hasFrame
+
+# returns integer keys that are equal exactly when '%.8f' formats the values identically,
+# including the sign '%.8f' keeps on negative values that round to zero
+def getSignatureKeys(values):
+	values = values.astype(np.float64)
+	keys = np.rint(values * 1e8).astype(np.int64) * 2
+	keys[(keys == 0) & np.signbit(values)] = 1
+	return keys
+
+# finds the unique vertex/uv combinations of a mesh, visiting loops polygon by polygon and merging loops whose
+# vertex index and three UVs would give the same '%i|%.8f|...' signature, in order of first occurrence.
+# Returns the vertex ids and (U, 6) UVs of the combinations, the combination indices of the first three loops
+# of every polygon and the polygon material indices. With useLoopTriangles the corners of mesh.loop_triangles
+# are visited instead, giving the triangles of Blender's own triangulation of the polygons.
+def getUniqueVertUVs(mesh, useLoopTriangles=False):
+	numLoops = len(mesh.loops)
+	numPolygons = len(mesh.polygons)
+
+	loopVertexIndices = np.empty(numLoops, dtype=np.int32)
+	mesh.loops.foreach_get("vertex_index", loopVertexIndices)
+
+	# missing second and third UV layers are written as (0.0, 1.0)
+	loopUVs = np.empty((numLoops, 6), dtype=np.float32)
+	loopUVs[:, 0::2] = 0.0
+	loopUVs[:, 1::2] = 1.0
+	for layerIndex, uvLayer in enumerate(mesh.uv_layers[:3]):
+		layerUVs = np.empty(numLoops * 2, dtype=np.float32)
+		uvLayer.data.foreach_get("uv", layerUVs)
+		loopUVs[:, 2 * layerIndex:2 * layerIndex + 2] = layerUVs.reshape(-1, 2)
+
+	if useLoopTriangles:
+		numTriangles = len(mesh.loop_triangles)
+		triangleLoops = np.empty(numTriangles * 3, dtype=np.int32)
+		materialIndexes = np.empty(numTriangles, dtype=np.int32)
+		mesh.loop_triangles.foreach_get("loops", triangleLoops)
+		mesh.loop_triangles.foreach_get("material_index", materialIndexes)
+
+		# loop indices in triangle corner order
+		firstVisits = np.arange(numTriangles, dtype=np.int64) * 3
+		loopOrder = triangleLoops.astype(np.int64)
+	else:
+		loopStarts = np.empty(numPolygons, dtype=np.int64)
+		loopTotals = np.empty(numPolygons, dtype=np.int64)
+		materialIndexes = np.empty(numPolygons, dtype=np.int32)
+		mesh.polygons.foreach_get("loop_start", loopStarts)
+		mesh.polygons.foreach_get("loop_total", loopTotals)
+		mesh.polygons.foreach_get("material_index", materialIndexes)
+
+		# loop indices in polygon order
+		firstVisits = np.cumsum(loopTotals) - loopTotals
+		loopOrder = np.repeat(loopStarts - firstVisits, loopTotals) + np.arange(loopTotals.sum())
+
+	keys = np.empty((len(loopOrder), 7), dtype=np.int64)
+	keys[:, 0] = loopVertexIndices[loopOrder]
+	keys[:, 1:] = getSignatureKeys(loopUVs[loopOrder])
+
+	uniqueKeys, firstIndexes, inverse = np.unique(keys, axis=0, return_index=True, return_inverse=True)
+
+	# renumber the sorted unique rows by first occurrence
+	occurrenceOrder = np.argsort(firstIndexes)
+	ranks = np.empty(len(occurrenceOrder), dtype=np.int64)
+	ranks[occurrenceOrder] = np.arange(len(occurrenceOrder))
+	visitIndexes = ranks[inverse.ravel()]
+
+	firstLoops = loopOrder[firstIndexes[occurrenceOrder]]
+	triangleVertUVIndexes = np.stack([visitIndexes[firstVisits + corner] for corner in range(3)], axis=1)
+
+	return loopVertexIndices[firstLoops], loopUVs[firstLoops], triangleVertUVIndexes, materialIndexes
+
+# formats the rows of (N, k) arrays placed side by side with one precompiled row format, yielding the
+# text of ROW_BLOCK_SIZE rows at a time rendered by a single % operation
+def formatRows(rowFormat, columnBlocks):
+	numRows = len(columnBlocks[0])
+	for start in range(0, numRows, ROW_BLOCK_SIZE):
+		stop = min(start + ROW_BLOCK_SIZE, numRows)
+		values = []
+		for rowParts in zip(*[block[start:stop].tolist() for block in columnBlocks]):
+			for part in rowParts:
+				values.extend(part)
+		yield (rowFormat * (stop - start)) % tuple(values)
+
+# identical copy of PhaseProfile in Blender-2.8-Addons/io_import_cn6.py, change all copies together
+class PhaseProfile:
+	def __init__(self, enabled=False):
+		self.enabled = enabled
+		self.phases = []
+		self.current = None
+		self.startTime = time.perf_counter()
+		self.ownsTracemalloc = enabled and not tracemalloc.is_tracing()
+		if self.ownsTracemalloc:
+			tracemalloc.start()
+
+	# ends the current phase and starts the named one
+	def begin(self, name, **counts):
+		if not self.enabled:
+			return
+		self.end()
+		if hasattr(tracemalloc, 'reset_peak'):
+			tracemalloc.reset_peak()
+		self.current = {'name': name, 'start': time.perf_counter(), 'counts': {}}
+		self.count(**counts)
+
+	# adds to the counts (verts, loops, bones, keys...) of the current phase
+	def count(self, **counts):
+		if self.current is None:
+			return
+		phaseCounts = self.current['counts']
+		for key, value in counts.items():
+			phaseCounts[key] = phaseCounts.get(key, 0) + int(value)
+
+	def end(self):
+		if self.current is None:
+			return
+		phase = self.current
+		phase['seconds'] = time.perf_counter() - phase['start']
+		phase['start'] = phase['start'] - self.startTime
+		phase['peakBytes'] = tracemalloc.get_traced_memory()[1] if tracemalloc.is_tracing() else None
+		self.phases.append(phase)
+		self.current = None
+
+	# ends profiling and writes <path>.profile.json, and <path>.trace.json with chromeTrace
+	def write(self, path, chromeTrace=False):
+		if not self.enabled:
+			return
+		self.end()
+		totalSeconds = time.perf_counter() - self.startTime
+		if self.ownsTracemalloc:
+			tracemalloc.stop()
+			self.ownsTracemalloc = False
+
+		# repeated phases, such as one per mesh, are summed up
+		totals = {}
+		for phase in self.phases:
+			total = totals.setdefault(phase['name'], {'calls': 0, 'seconds': 0.0, 'peakBytes': None, 'counts': {}})
+			total['calls'] += 1
+			total['seconds'] += phase['seconds']
+			if phase['peakBytes'] is not None:
+				total['peakBytes'] = max(total['peakBytes'] or 0, phase['peakBytes'])
+			for key, value in phase['counts'].items():
+				total['counts'][key] = total['counts'].get(key, 0) + value
+
+		report = {'file': path, 'seconds': totalSeconds, 'phases': totals, 'timeline': self.phases}
+		with open(path + '.profile.json', 'w') as file:
+			json.dump(report, file, indent=1)
+		log.info("Profile written to %s.profile.json", path)
+
+		if chromeTrace:
+			events = []
+			for phase in self.phases:
+				args = dict(phase['counts'])
+				args['peakBytes'] = phase['peakBytes']
+				events.append({'name': phase['name'], 'ph': 'X', 'pid': os.getpid(), 'tid': 0,
+					'ts': phase['start'] * 1e6, 'dur': phase['seconds'] * 1e6, 'args': args})
+			with open(path + '.trace.json', 'w') as file:
+				json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, file)
+			log.info("Chrome trace written to %s.trace.json", path)
+
+def do_export(filename, triangulate, use_selection, precision=8, verbosity='SUMMARY', profile=False, chrome_trace=False):
+	setVerbosity(verbosity)
+	log.info("Start CN6 Export to %s", filename)
+
+	phaseProfile = PhaseProfile(profile)
+	try:
+		return exportCN6(filename, triangulate, use_selection, precision, phaseProfile)
+	finally:
+		phaseProfile.write(filename, chrome_trace)
 
-def do_export(filename, triangulate, use_selection):
-	print ("Start CN6 Export...")
+def exportCN6(filename, triangulate, use_selection, precision, profile):
+	# Sections are streamed to a temporary file that only replaces the output once the export succeeds
+	tempFilename = filename + '.tmp'
+	file = open(tempFilename, 'w', buffering=WRITE_BUFFER_SIZE)
+	file.write("// CivNexus6 CN6 - Exported from Blender for import to CivNexus6\n")
 
-	file = open( filename, 'w')
-	filedata = "// CivNexus6 CN6 - Exported from Blender for import to CivNexus6\n"
+	# Triangulated copies of meshes, removed whether or not the export succeeds
+	tempMeshes = []
 
 	try:
 		modelObs = {}
@@ -146,7 +468,7 @@ def do_export(filename, triangulate, use_selection):
 				modelObs[object.name] = object
 
 			if object.type == 'MESH':
-				print ("Getting parent for mesh: %s" % object.name)
+				log.debug("Getting parent for mesh: %s", object.name)
 				for modifier in object.modifiers:
 					if modifier.object is not None:
 						parentArmOb = modifier.object
@@ -158,7 +480,8 @@ def do_export(filename, triangulate, use_selection):
 			boneIds = {}
 
 			# Write Skeleton
-			filedata += "skeleton\n"
+			profile.begin("skeleton", bones=len(modelObs[modelObName].data.bones))
+			file.write("skeleton\n")
 
 			armOb = modelObs[modelObName]
 			armature = armOb.data
@@ -179,15 +502,12 @@ def do_export(filename, triangulate, use_selection):
 			boneIds[armOb.name] = -1 # Add entry for World Bone
 
 			# Write World Bone
-			filedata += '%d "%s" %d ' % (0, armOb.name, -1)
-			filedata += '%.8f %.8f %.8f ' % (0.0, 0.0, 0.0)
-			filedata += '%.8f %.8f %.8f %.8f ' % (0.0, 0.0, 0.0, 1.0)
-			filedata += '%.8f %.8f %.8f %.8f %.8f %.8f %.8f %.8f %.8f %.8f %.8f %.8f %.8f %.8f %.8f %.8f\n' % (1.0, 0.0, 0.0, 0.0, 0.0, 1.0, 0.0, 0.0, 0.0, 0.0, 1.0, 0.0, 0.0, 0.0, 0.0, 1.0)
+			file.write('%d "%s" %d ' % (0, armOb.name, -1))
+			file.write('%.8f %.8f %.8f ' % (0.0, 0.0, 0.0))
+			file.write('%.8f %.8f %.8f %.8f ' % (0.0, 0.0, 0.0, 1.0))
+			file.write('%.8f %.8f %.8f %.8f %.8f %.8f %.8f %.8f %.8f %.8f %.8f %.8f %.8f %.8f %.8f %.8f\n' % (1.0, 0.0, 0.0, 0.0, 0.0, 1.0, 0.0, 0.0, 0.0, 0.0, 1.0, 0.0, 0.0, 0.0, 0.0, 1.0))
 
-			print ("armOb.name/armature.bones[0].name/len(boneIds)")
-			print (armOb.name)
-			print (armature.bones[0].name)
-			print (len(boneIds))
+			log.info("%s: %d bones, first bone %s", armOb.name, len(boneIds), armature.bones[0].name)
 
 			if (len(boneIds) > 1 or armOb.name != armature.bones[0].name):
 				for boneid, boneTuple in enumerate(sortedBones):
@@ -211,353 +531,142 @@ def do_export(filename, triangulate, use_selection):
 
 					outputBoneName = bone.name
 
-					filedata += '%d "%s" ' % (boneid + 1, outputBoneName)   # Adjust bone ids + 1 as zero is the World Bone
+					file.write('%d "%s" ' % (boneid + 1, outputBoneName))   # Adjust bone ids + 1 as zero is the World Bone
 
 					parentBoneId = 0
 					if bone.parent:
 						parentBoneId = boneIds[bone.parent.name] + 1   # Adjust bone ids + 1 as zero is the World Bone
 
-					filedata += '%d ' % parentBoneId
-					filedata +='%.8f %.8f %.8f ' % (position[0], position[1], position[2])
-					filedata +='%.8f %.8f %.8f %.8f ' % (orientationQuat[1], orientationQuat[2], orientationQuat[3], orientationQuat[0]) # GR2 uses x,y,z,w for Quaternions rather than w,x,y,z
-					filedata += '%.8f %.8f %.8f %.8f %.8f %.8f %.8f %.8f %.8f %.8f %.8f %.8f %.8f %.8f %.8f %.8f' % (invWorldMatrix[0][0], invWorldMatrix[0][1], invWorldMatrix[0][2], invWorldMatrix[0][3],
+					file.write('%d ' % parentBoneId)
+					file.write('%.8f %.8f %.8f ' % (position[0], position[1], position[2]))
+					file.write('%.8f %.8f %.8f %.8f ' % (orientationQuat[1], orientationQuat[2], orientationQuat[3], orientationQuat[0])) # GR2 uses x,y,z,w for Quaternions rather than w,x,y,z
+					file.write('%.8f %.8f %.8f %.8f %.8f %.8f %.8f %.8f %.8f %.8f %.8f %.8f %.8f %.8f %.8f %.8f' % (invWorldMatrix[0][0], invWorldMatrix[0][1], invWorldMatrix[0][2], invWorldMatrix[0][3],
 																						invWorldMatrix[1][0], invWorldMatrix[1][1], invWorldMatrix[1][2], invWorldMatrix[1][3],
 																						invWorldMatrix[2][0], invWorldMatrix[2][1], invWorldMatrix[2][2], invWorldMatrix[2][3],
-																						invWorldMatrix[3][0], invWorldMatrix[3][1], invWorldMatrix[3][2], invWorldMatrix[3][3])
+																						invWorldMatrix[3][0], invWorldMatrix[3][1], invWorldMatrix[3][2], invWorldMatrix[3][3]))
 					#End of bone line
-					filedata += "\n"
+					file.write("\n")
 
 			if len(modelMeshes) == 0:
-				filedata += 'meshes:%d\n' % 0
+				file.write('meshes:%d\n' % 0)
 			else:
-				filedata += 'meshes:%d\n' % len(modelMeshes[modelObName])
+				file.write('meshes:%d\n' % len(modelMeshes[modelObName]))
 
 				for meshObject in modelMeshes[modelObName]:
 
+					profile.begin("mesh preparation")
 					mesh = meshObject.data
+					useLoopTriangles = False
 					if triangulate:
-						mesh = mesh.copy()
-						bm = bmesh.new()
-						bm.from_mesh(mesh)
+						loopTotals = np.empty(len(mesh.polygons), dtype=np.int32)
+						mesh.polygons.foreach_get("loop_total", loopTotals)
 
-						bmesh.ops.triangulate(bm, faces=bm.faces[:])
+						if np.any(loopTotals > 4):
+							# Tangents can only be calculated for tris and quads, so n-gons are triangulated on a temporary mesh
+							mesh = mesh.copy()
+							tempMeshes.append(mesh)
+							bm = bmesh.new()
+							bm.from_mesh(mesh)
 
-						# Finish up, write the bmesh back to the mesh
-						bm.to_mesh(mesh)
-						bm.free()
+							bmesh.ops.triangulate(bm, faces=bm.faces[:])
+
+							# Finish up, write the bmesh back to the mesh
+							bm.to_mesh(mesh)
+							bm.free()
+						else:
+							# Triangles come from Blender's own tessellation, leaving the mesh untouched
+							mesh.calc_loop_triangles()
+							useLoopTriangles = True
 
 					meshName = meshObject.name
 
-					filedata += 'mesh:"%s"\n' % meshName
+					file.write('mesh:"%s"\n' % meshName)
 
-					filedata += 'materials\n'
+					file.write('materials\n')
 					for material in meshObject.data.materials:
-						filedata += '\"%s\"\n' % material.name
+						file.write('\"%s\"\n' % material.name)
 
 					# Read in preserved Normals, Binormals and Tangents
-					vertexBinormalsTangents = {}
-					originalVertexNormals = {}
-
-					useOriginalNormals = meshObject.vertex_groups.get("VERTEX_KEYS") is not None and mesh.get('originalTangentsBinormals') is not None
-
-					if useOriginalNormals:
-						for index, vertex in enumerate(mesh.vertices):
-
-								keyVertexGroup = meshObject.vertex_groups.get("VERTEX_KEYS")
-								if keyVertexGroup is not None:
-									weight = vertex.groups[keyVertexGroup.index].weight * 2000000
-									decodedVertexIndex = str(int(round(weight)))
-
-									print ("{}: decodedVertexIndex:{}".format(index, decodedVertexIndex))
+					originalFrames = getOriginalFrames(meshObject, mesh)
+					useOriginalNormals = originalFrames is not None
 
-									if mesh['originalTangentsBinormals'].get(decodedVertexIndex) is not None:
-										tangentsBinormals = mesh['originalTangentsBinormals'][decodedVertexIndex]
-										originalVertexNormals[str(index)] = tangentsBinormals
-
-					# This will wipe out custom normals
+					# Tangents are computed on the loops, the mesh keeps its own normals
 					mesh.calc_tangents(uvmap = mesh.uv_layers[0].name)
 
-					for poly in mesh.polygons:
-						for loop_index in poly.loop_indices:
-
-							currentVertexIndex = mesh.loops[loop_index].vertex_index
-							loop = mesh.loops[loop_index]
-
-							currentVertBinormTang = (loop.normal[0], loop.normal[1], loop.normal[2], loop.tangent[0],loop.tangent[1],loop.tangent[2], loop.bitangent[0], loop.bitangent[1], loop.bitangent[2])
-
-							if not currentVertexIndex in vertexBinormalsTangents:
-								vertexBinormalsTangents[currentVertexIndex] = []
-							vertexBinormalsTangents[currentVertexIndex].append(currentVertBinormTang)
-
-					if useOriginalNormals:
-						# Reset Custom Loop Normals
-						mesh.create_normals_split()
-
-						matchedLoops = 0
-						for loopIndex, loop in enumerate(mesh.loops):
-							if originalVertexNormals.get(str(loop.vertex_index)) is not None:
-								normalsEtc = originalVertexNormals[str(loop.vertex_index)]
-								loop.normal =  (normalsEtc[0], normalsEtc[1], normalsEtc[2])
-								matchedLoops += 1
-
-						mesh.validate(clean_customdata=False)
-
-						clnors = array.array('f', [0.0] * (len(mesh.loops) * 3))
-						mesh.loops.foreach_get("normal", clnors)
-
-						mesh.polygons.foreach_set("use_smooth", [True] * len(mesh.polygons))
-
-						mesh.normals_split_custom_set(tuple(zip(*(iter(clnors),) * 3)))
-						mesh.use_auto_smooth = True
-
 					# Average out Normals, Tangents and Bitangents for each Vertex
-					vertexNormsBinormsTangsSelected = {}
-
-					for vertId in vertexBinormalsTangents.keys():
-
-						sum0, sum1, sum2, sum3, sum4, sum5, sum6, sum7, sum8 = 0,0,0,0,0,0,0,0,0
-
-						for currentrow in vertexBinormalsTangents[vertId]:
-							sum0 = sum0 + currentrow[0]
-							sum1 = sum1 + currentrow[1]
-							sum2 = sum2 + currentrow[2]
-
-							sum3 = sum3 + currentrow[3]
-							sum4 = sum4 + currentrow[4]
-							sum5 = sum5 + currentrow[5]
-
-							sum6 = sum6 + currentrow[6]
-							sum7 = sum7 + currentrow[7]
-							sum8 = sum8 + currentrow[8]
-
-						numRows = len(vertexBinormalsTangents[vertId])
-
-						vertexNormsBinormsTangsSelected[vertId] = (sum0/numRows, sum1/numRows, sum2/numRows,
-																	sum3/numRows, sum4/numRows, sum5/numRows,
-																	sum6/numRows, sum7/numRows, sum8/numRows)
+					vertexNormsBinormsTangsSelected = getAveragedLoopFrames(mesh)
 
 					# Get Bone Weights
-					weights = meshNormalizedWeights(meshObject, mesh)
-					vertexBoneWeights = {}
-					print (meshName)
-					print ("len(mesh.polygons)")
-					print (len(mesh.polygons))
-					print ("len(mesh.loops)")
-					print (len(mesh.loops))
-					print ("len(weights[0])")
-					print (len(weights[0]))
-
-					for boneName in boneIds.keys():
-						vgroupDataForBone = getBoneWeights(boneName, weights)
-
-						for vgData in vgroupDataForBone:
-							vertexId = vgData[0]
-							weight = vgData[1]
-							if not vertexId in vertexBoneWeights:
-								vertexBoneWeights[vertexId] = []
-							vertexBoneWeights[vertexId].append((boneName, weight))
-
-					print ("len(mesh.vertices)")
-					print (len(mesh.vertices))
-					print ("len(vertexBoneWeights.keys())")
-					print (len(vertexBoneWeights.keys()))
-
-					grannyVertexBoneWeights = {}
-					for vertId in vertexBoneWeights.keys():
-
-						rawBoneIdWeightTuples = []
-						firstBoneId = 0
-						for i in range(max(8,len(vertexBoneWeights[vertId]))):
-							if i < len(vertexBoneWeights[vertId]):
-								vertexBoneWeightTuple = vertexBoneWeights[vertId][i]
-								boneName = vertexBoneWeightTuple[0]
-								rawBoneIdWeightTuples.append((boneIds[boneName] + 1, vertexBoneWeightTuple[1]))
-								if i == 0:
-									firstBoneId = boneIds[boneName] + 1
-							else:
-								rawBoneIdWeightTuples.append((firstBoneId, 0))
-
-						# Sort bone mappings by weight highest to lowest
-						sortedBoneIdWeightTuples = sorted(rawBoneIdWeightTuples, key=lambda rawBoneIdWeightTuple: rawBoneIdWeightTuple[1], reverse=True)
-
-						# Pick first 8 highest weighted bones
-						boneIdsList = []
-						rawBoneWeightsList = []
-						for i in range(8):
-							boneIdsList.append(sortedBoneIdWeightTuples[i][0])
-							rawBoneWeightsList.append(sortedBoneIdWeightTuples[i][1])
-
-						rawWeightTotal = 0
-						for weight in rawBoneWeightsList:
-							rawWeightTotal = rawWeightTotal + weight
-
-						boneWeightsList = []
-						for weight in rawBoneWeightsList:
-							calcWeight = round(255 * weight / rawWeightTotal)
-							boneWeightsList.append(calcWeight)
-
-						# Ensure that total of vertex bone weights is 255
-						runningTotal = 0
-						for i, weight in enumerate(boneWeightsList):
-							runningTotal = runningTotal + weight
-
-						if runningTotal != 255:
-							boneWeightsList[0] = boneWeightsList[0] + (255 - runningTotal)
-
-						runningTotal = 0
-						for i, weight in enumerate(boneWeightsList):
-							runningTotal = runningTotal + weight
-
-						#print("Current Running Total")
-						#print(runningTotal)
-
-						if runningTotal != 255:
-							raise "Error: Vertex bone weights do not total 255!"
-
-						if not vertId in grannyVertexBoneWeights:
-							grannyVertexBoneWeights[vertId] = []
-						grannyVertexBoneWeights[vertId] = (boneIdsList, boneWeightsList)
+					profile.begin("bone weights", verts=len(mesh.vertices))
+					rowStarts, influenceBoneIds, influenceWeights = getBoneInfluences(meshObject, mesh, boneIds)
+					weightedVertIds = np.flatnonzero(np.diff(rowStarts))
+					log.info("%s: %d vertices (%d weighted), %d polygons, %d loops, %d vertex groups", meshName,
+						len(mesh.vertices), len(weightedVertIds), len(mesh.polygons), len(mesh.loops), len(meshObject.vertex_groups))
+
+					vertexBoneIds, vertexBoneWeights, quantizationErrors = getQuantizedBoneWeights(rowStarts, influenceBoneIds, influenceWeights)
 
 					position, orientationQuat = getTranslationOrientation(meshObject)
 
-					filedata += "vertices\n"
+					file.write("vertices\n")
 
-					print ("grannyVertexBoneWeights")
-					print (len(grannyVertexBoneWeights))
-					print ("Write Vertices")
+					log.info("%s: quantized bone weights of %d vertices, %d with more than 8 bones", meshName, len(weightedVertIds), np.count_nonzero(np.diff(rowStarts) > 8))
+					if len(weightedVertIds):
+						log.info("%s: quantization error (1/255): mean %.4f, max %.4f", meshName, quantizationErrors[weightedVertIds].mean(), quantizationErrors[weightedVertIds].max())
 
 					# Get unique vertex/uv coordinate combinations
-					uniqueVertSet = set()
-					uniqueVertUVIndexes = {}
-					uniqueVertUVs = []
-					currentVertUVIndex = 0
-
-					currentTriangleId = 0
-					triangleVertUVIndexes = []
-					triangleMaterialIndexes = []
-
-					for poly in mesh.polygons:
-						triangleVertUVIndexes.append([])
-
-						for loop_index in poly.loop_indices:
-							vertexId = mesh.loops[loop_index].vertex_index
-
-							if (mesh.uv_layers[0]):
-								uv = mesh.uv_layers[0].data[loop_index].uv
-							else:
-								uv = (0.0, 1.0)
-
-							if (len(mesh.uv_layers) > 1):
-								uv2 = mesh.uv_layers[1].data[loop_index].uv
-							else:
-								uv2 = (0.0, 1.0)
-
-							if (len(mesh.uv_layers) > 2):
-								uv3 = mesh.uv_layers[2].data[loop_index].uv
-							else:
-								uv3 = (0.0, 1.0)
-
-							uvt = tuple(uv)
-							uv2t = tuple(uv2)
-							uv3t = tuple(uv3)
-
-							vertSig = '%i|%.8f|%.8f|%.8f|%.8f|%.8f|%.8f' % (vertexId, uvt[0], uvt[1], uv2t[0], uv2t[1], uv3t[0], uv3t[1])
-
-							if vertSig in uniqueVertSet:
-								triangleVertUVIndex = uniqueVertUVIndexes[vertSig]
-							else:
-								uniqueVertSet.add(vertSig)
-								uniqueVertUVIndexes[vertSig] = currentVertUVIndex
-								uniqueVertUVs.append((vertexId, uvt[0], uvt[1], uv2t[0], uv2t[1], uv3t[0], uv3t[1]))
-								triangleVertUVIndex = currentVertUVIndex
-								currentVertUVIndex = currentVertUVIndex + 1
-
-							triangleVertUVIndexes[currentTriangleId].append(triangleVertUVIndex)
-
-						triangleMaterialIndexes.append(poly.material_index)
-						currentTriangleId = currentTriangleId + 1
-
-					# Write Vertices
-					preservedTangsBinormsCount = 0
-					calculatedTangsBinormsCount = 0
-
-					# Write Vertices
-					for uniqueVertUV in uniqueVertUVs:
-
-						vertexIndex = uniqueVertUV[0]
-						vertex = mesh.vertices[vertexIndex]
-						vertCoord = tuple(vertex.co)
-
-						uv = (uniqueVertUV[1], uniqueVertUV[2])
-						uv2 = (uniqueVertUV[3], uniqueVertUV[4])
-						uv3 = (uniqueVertUV[5], uniqueVertUV[6])
-
-						vertexFound = False
-
-						if originalVertexNormals.get(str(vertexIndex)) is not None:
-							tangentsBinormals = originalVertexNormals[str(vertexIndex)]
-							vertNormal = (tangentsBinormals[0],tangentsBinormals[1],tangentsBinormals[2])
-							vertTangent = (tangentsBinormals[3],tangentsBinormals[4],tangentsBinormals[5])
-							vertBinormal = (tangentsBinormals[6],tangentsBinormals[7],tangentsBinormals[8])
-							vertexFound = True
-						else:
-							vertNBT = vertexNormsBinormsTangsSelected[vertexIndex]
-							vertNormal = (vertNBT[0], vertNBT[1], vertNBT[2])
-							vertTangent = (vertNBT[3], vertNBT[4], vertNBT[5])
-							vertBinormal = (vertNBT[6], vertNBT[7], vertNBT[8])
+					profile.begin("unique vertices", loops=len(mesh.loops))
+					uniqueVertexIds, uniqueUVs, triangleVertUVIndexes, triangleMaterialIndexes = getUniqueVertUVs(mesh, useLoopTriangles)
 
-						if (vertexFound):
-							preservedTangsBinormsCount += 1
-						else:
-							calculatedTangsBinormsCount += 1
-
-						filedata +='%.8f %.8f %.8f ' % (vertCoord[0] + position[0],  vertCoord[1] +  position[1], vertCoord[2] + position[2])
-						filedata +='%.8f %.8f %.8f ' % (vertNormal[0], vertNormal[1], vertNormal[2])
-						filedata +='%.8f %.8f %.8f ' % (vertTangent[0], vertTangent[1], vertTangent[2])
-						filedata +='%.8f %.8f %.8f ' % (vertBinormal[0], vertBinormal[1], vertBinormal[2])
-
-						filedata +='%.8f %.8f ' % (uv[0], 1 - uv[1])
-						filedata +='%.8f %.8f ' % (uv2[0], 1 - uv2[1])
-						filedata +='%.8f %.8f ' % (uv3[0], 1 - uv3[1])
-
-						if vertexIndex in grannyVertexBoneWeights:
-							vBoneWeightTuple = grannyVertexBoneWeights[vertexIndex]
-						else:
-							#raise "Error: Mesh has unweighted vertices!"
-							vBoneWeightTuple = ([-1,-1,-1,-1,-1,-1,-1,-1],[-1,-1,-1,-1,-1,-1,-1,-1]) # Unweighted vertex - raise error
-
-						filedata +='%d %d %d %d %d %d %d %d ' % (vBoneWeightTuple[0][0], vBoneWeightTuple[0][1],vBoneWeightTuple[0][2],vBoneWeightTuple[0][3], vBoneWeightTuple[0][4], vBoneWeightTuple[0][5],vBoneWeightTuple[0][6],vBoneWeightTuple[0][7]) # Bone Ids
-						filedata +='%d %d %d %d %d %d %d %d\n' % (vBoneWeightTuple[1][0], vBoneWeightTuple[1][1],vBoneWeightTuple[1][2],vBoneWeightTuple[1][3], vBoneWeightTuple[1][4], vBoneWeightTuple[1][5],vBoneWeightTuple[1][6],vBoneWeightTuple[1][7]) # Bone Weights
+					# Normals, tangents and binormals, preserved where the importer left them
+					vertexFrames = vertexNormsBinormsTangsSelected[uniqueVertexIds]
+					if useOriginalNormals:
+						preserved = originalFrames[1][uniqueVertexIds]
+						vertexFrames[preserved] = originalFrames[0][uniqueVertexIds[preserved]]
+						preservedTangsBinormsCount = int(np.count_nonzero(preserved))
+					else:
+						preservedTangsBinormsCount = 0
+					calculatedTangsBinormsCount = len(uniqueVertexIds) - preservedTangsBinormsCount
+
+					vertCoords = np.empty(len(mesh.vertices) * 3, dtype=np.float32)
+					mesh.vertices.foreach_get("co", vertCoords)
+					vertCoords = vertCoords.reshape(-1, 3)[uniqueVertexIds] + np.array(position[0:3], dtype=np.float64)
+
+					vertUVs = uniqueUVs.astype(np.float64)
+					vertUVs[:, 1::2] = 1 - vertUVs[:, 1::2]
+
+					# Write Vertices, unweighted vertices have -1 bone ids and weights
+					profile.begin("write vertices", verts=len(uniqueVertexIds))
+					floatFormat = '%.{}f'.format(precision)
+					vertexFormat = ' '.join(['%.8f'] * 3 + [floatFormat] * 15 + ['%d'] * 16) + '\n'
+					for text in formatRows(vertexFormat, (vertCoords, vertexFrames, vertUVs, vertexBoneIds[uniqueVertexIds], vertexBoneWeights[uniqueVertexIds])):
+						file.write(text)
 
 					# Write Triangles
-					filedata += "triangles\n"
+					profile.begin("write triangles", triangles=len(triangleVertUVIndexes))
+					file.write("triangles\n")
 
-					outputTriangles = []
-					for triangle_id, triangle in enumerate(triangleVertUVIndexes): # mesh.polygons:
-						materialIndex = triangleMaterialIndexes[triangle_id]
-						outputTriangles.append((triangle[0],triangle[1],triangle[2], materialIndex))
+					# Triangles grouped by material, keeping polygon order within a material
+					sortedOutputTriangles = np.column_stack((triangleVertUVIndexes, triangleMaterialIndexes))
+					sortedOutputTriangles = sortedOutputTriangles[np.argsort(triangleMaterialIndexes, kind='stable')]
 
-					sortedOutputTriangles = sorted(outputTriangles, key=lambda triangle: triangle[3])
+					for text in formatRows('%i %i %i %i\n', (sortedOutputTriangles,)):
+						file.write(text)
 
-					for triangle in sortedOutputTriangles:
-						filedata += '%i %i %i %i\n' % (triangle[0],triangle[1],triangle[2], triangle[3])
+					log.info("%s: %d vertices written, %d preserved and %d calculated tangents/binormals", meshName,
+						len(uniqueVertexIds), preservedTangsBinormsCount, calculatedTangsBinormsCount)
 
-					print ("meshName: {}".format(meshName))
-					print ("preservedTangsBinormsCount: {}".format(preservedTangsBinormsCount))
-					print ("calculatedTangsBinormsCount: {}".format(calculatedTangsBinormsCount))
-
-		filedata += "end"
-		file.write(filedata)
-		file.flush()
+		file.write("end")
 		file.close()
+		os.replace(tempFilename, filename)
 	except:
-		filedata += "aborted!"
-		file.write(filedata)
-		file.flush()
 		file.close()
+		os.remove(tempFilename)
 		raise
+	finally:
+		for tempMesh in tempMeshes:
+			bpy.data.meshes.remove(tempMesh)
 
-	print ("End CN6 Export.")
+	log.info("End CN6 Export.")
 	return ""
 
 class export_cn6(bpy.types.Operator, ExportHelper):
@@ -581,12 +690,38 @@ class export_cn6(bpy.types.Operator, ExportHelper):
 			description="Export only selected and visible objects",
 			default=False,
 			)
+	precision: IntProperty(
+			name="Precision",
+			description="Decimal places written for vertex normals, tangents, binormals and UVs",
+			default=8,
+			min=1,
+			max=8,
+			)
+	verbosity: EnumProperty(
+			name="Verbosity",
+			description="Amount of console output",
+			items=VERBOSITY_ITEMS,
+			default='SUMMARY',
+			)
+	profile: BoolProperty(
+			name="Write Profile",
+			description="Write the time, memory peak and counts of each export phase to a .profile.json file next to the .cn6",
+			default=False,
+			)
+	chrome_trace: BoolProperty(
+			name="Write Chrome Trace",
+			description="With Write Profile, also write a .trace.json file for chrome://tracing",
+			default=False,
+			)
 
 	def execute(self, context):
-		print ("Export Filename: {}".format(self.filepath))
 		do_export(self.filepath,
 			self.triangulate,
 			self.use_selection,
+			self.precision,
+			self.verbosity,
+			self.profile,
+			self.chrome_trace,
 			)
 		return {'FINISHED'}
 
@@ -12,6 +12,20 @@ bl_info = {
 import bpy
 import array
 import shlex
+import os
+import mmap
+import json
+import struct
+import hashlib
+import locale
+import re
+import sys
+import time
+import tracemalloc
+import logging
+import multiprocessing
+import concurrent.futures
+import numpy as np
 from bpy.props import BoolProperty, IntProperty, EnumProperty, StringProperty
 from mathutils import Vector, Quaternion, Matrix
 from bpy_extras.io_utils import unpack_list, unpack_face_list, ImportHelper
@@ -50,13 +64,52 @@ def writeRotationMatrix(matrix_4x4, matrix_3x3):
 		for y in range(0, 3):
 			matrix_4x4[x][y] = matrix_3x3[x][y]
 
+CACHE_MAGIC = b'CN6B'
+CACHE_VERSION = 1
+
+# names under which the original normal/tangent/binormal frames are kept for io_export_cn6
+ORIGINAL_INDEX_ATTRIBUTE = "cn6_original_index"
+ORIGINAL_FRAMES_PROPERTY = "cn6OriginalFrames"
+
+# start of every line that holds something other than whitespace
+ROW_PATTERN = re.compile(r'^[ \t]*\S', re.MULTILINE)
+
+# matches the keyword lines that start the sections of a cn6 file
+SECTION_PATTERN = re.compile(rb'^[ \t]*(skeleton|meshes:[^\r\n]*|mesh:[^\r\n]*|materials|vertices|triangles|end)[ \t]*\r?$', re.MULTILINE)
+
+# cn6 files are read with the same default encoding as text mode open()
+FILE_ENCODING = locale.getpreferredencoding(False)
+
+# every add-on, 2.7 and 2.8, logs below one shared logger named civ_blender, so a single console handler and
+# level serve all of them; each file keeps its own copy of setVerbosity as the add-ons install separately
+LOG_NAME = "civ_blender"
+log = logging.getLogger(LOG_NAME + "." + __name__)
+
+VERBOSITY_ITEMS = (
+	('QUIET', "Quiet", "Warnings only"),
+	('SUMMARY', "Summary", "Totals per file, mesh and animation"),
+	('DEBUG', "Debug", "Everything, including per bone, vertex and frame detail"),
+	)
+VERBOSITY_LEVELS = {'QUIET': logging.WARNING, 'SUMMARY': logging.INFO, 'DEBUG': logging.DEBUG}
+
+# sends the shared add-on logger to the console at the given verbosity
+def setVerbosity(verbosity):
+	addonLog = logging.getLogger(LOG_NAME)
+	if not addonLog.handlers:
+		handler = logging.StreamHandler(sys.stdout)
+		handler.setFormatter(logging.Formatter("%(name)s: %(message)s"))
+		addonLog.addHandler(handler)
+		addonLog.propagate = False
+	addonLog.setLevel(VERBOSITY_LEVELS[verbosity])
+
+
 # returns the next non-empty, non-comment line from the file
 def getNextLine(file):
 	ready = False
 	while ready==False:
 		line = file.readline()
 		if len(line)==0:
-			print ("Warning: End of file reached.")
+			log.warning("End of file reached.")
 			return line
 		ready = True
 		line = line.strip()
@@ -66,8 +119,495 @@ def getNextLine(file):
 			ready = False
 	return line
 
-def do_import(path, DELETE_TOP_BONE=True):
+# returns the non-empty, non-comment lines of a block of text
+def getBlockLines(text):
+	lines = []
+	for line in text.splitlines():
+		line = line.strip()
+		if len(line)==0 or line.startswith('//'):
+			continue
+		lines.append(line)
+	return lines
+
+# returns a block of numbers as text that np.fromstring can convert in one go
+def getNumberText(text):
+	if '//' in text:
+		return '\n'.join(getBlockLines(text))
+	return text
+
+# returns the number of rows in a block of numbers. np.fromstring stops early on a malformed number (older
+# numpy only warns), so the converted size is checked against the rows to catch short or broken rows
+def countRows(text):
+	return len(ROW_PATTERN.findall(text))
+
+# converts the bone lines of a skeleton block into name list and parent, position and quaternion arrays
+def parseSkeletonBlock(text):
+	boneNames = []
+	parentBoneIds = []
+	positions = []
+	quaternions = []
+
+	for line in getBlockLines(text):
+		lines = shlex.split(line)
+		boneNames.append(lines[1])
+		parentBoneIds.append(int(lines[2]))
+		positions.append([float(lines[3]), float(lines[4]), float(lines[5])])
+		quaternions.append([float(lines[6]), float(lines[7]), float(lines[8]), float(lines[9])])
+
+	return {
+		'names': boneNames,
+		'parents': np.array(parentBoneIds, dtype=np.int32),
+		'positions': np.array(positions, dtype=np.float32).reshape(-1, 3),
+		'quaternions': np.array(quaternions, dtype=np.float32).reshape(-1, 4),
+	}
+
+# converts the quoted names of a materials block into a list
+def parseMaterialBlock(text):
+	return [line[1:-1] for line in getBlockLines(text)]
+
+# converts the text of a vertices block in one pass into an (N, 34) float32 array:
+# position, normal, tangent, binormal, 3 uv pairs, 8 bone ids and 8 bone weights per row
+def parseVertexBlock(text):
+	text = getNumberText(text)
+	return packVertexBlock(np.fromstring(text, dtype=np.float32, sep=' '), countRows(text))
+
+def packVertexBlock(data, numRows):
+	if data.size != numRows * 34:
+		raise ValueError("Vertex data invalid!")
+	return data.reshape(-1, 34)
+
+# converts the text of a triangles block into a (T, 4) int32 array of vertex indices and material index,
+# dropping triangles that reference missing vertices or materials
+def parseTriangleBlock(text, numVerts, numMaterials):
+	text = getNumberText(text)
+	return packTriangleBlock(np.fromstring(text, dtype=np.int32, sep=' '), countRows(text), numVerts, numMaterials)
+
+def packTriangleBlock(data, numRows, numVerts, numMaterials):
+	if data.size != numRows * 4: # Fourth element is material index
+		raise ValueError("Triangle data invalid!")
+	triangles = data.reshape(-1, 4)
+	valid = np.all(triangles[:, 0:3] < numVerts, axis=1) & (triangles[:, 3] < numMaterials)
+	return triangles[valid]
+
+# scans a cn6 file once and returns the byte offsets of its sections: the (start, end) span of the bone table,
+# the declared mesh count and the name plus materials/vertices/triangles spans of every mesh block
+def indexCN6(path):
+	index = {'skeleton': None, 'meshCount': None, 'meshes': []}
+
+	with open(path, 'rb') as file:
+		try:
+			data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+		except ValueError:
+			return index # empty file
+
+	with data:
+		matches = list(SECTION_PATTERN.finditer(data))
+		for n, match in enumerate(matches):
+			keyword = match.group(1).decode(FILE_ENCODING).strip()
+			span = (match.end(), matches[n + 1].start() if n + 1 < len(matches) else len(data))
+
+			if keyword == 'skeleton':
+				if n == 0:
+					index['skeleton'] = span
+			elif keyword.startswith('meshes:'):
+				index['meshCount'] = keyword.replace('meshes:','')
+			elif keyword.startswith('mesh:'):
+				index['meshes'].append({'name': keyword.split(':')[1][1:-1]})
+			elif keyword != 'end' and index['meshes']:
+				index['meshes'][-1][keyword] = span
+
+	return index
+
+# reads the skeleton table and the selected mesh blocks of an indexed cn6 file into arrays, without touching
+# Blender data; meshNames limits the meshes read (None reads all of them, an empty list only the skeleton).
+# When an executor is given the vertex and triangle blocks are converted by its worker processes.
+def readCN6(path, index, meshNames=None, executor=None):
+	if index['skeleton'] is None:
+		raise ValueError("File invalid!")
+
+	# read the number of meshes
+	try:
+		numMeshes = int(index['meshCount'])
+		if numMeshes < 0 or numMeshes > len(index['meshes']):
+			raise ValueError
+	except (TypeError, ValueError):
+		raise ValueError("Number of meshes is invalid!")
+
+	with open(path, 'rb') as file:
+		def readSection(span):
+			file.seek(span[0])
+			return file.read(span[1] - span[0]).decode(FILE_ENCODING)
+
+		# np.fromstring only needs numpy, so workers can run it without importing this add-on. Returns the
+		# conversion as a future, already done without an executor, with the row count of the block.
+		def convertNumbers(span, dtype):
+			text = getNumberText(readSection(span))
+			if executor is not None:
+				return executor.submit(np.fromstring, text, dtype=dtype, sep=' '), countRows(text)
+			job = concurrent.futures.Future()
+			try:
+				job.set_result(np.fromstring(text, dtype=dtype, sep=' '))
+			except ValueError as e:
+				job.set_exception(e)
+			return job, countRows(text)
+
+		# newer numpy raises on a malformed number where older numpy stops early, both end up as the same error
+		def getNumbers(job, error):
+			try:
+				return job[0].result(), job[1]
+			except ValueError:
+				raise ValueError(error)
+
+		skeleton = parseSkeletonBlock(readSection(index['skeleton']))
+
+		# read meshes
+		jobs = []
+		for meshIndex in index['meshes'][:numMeshes]:
+			if meshNames is not None and meshIndex['name'] not in meshNames:
+				continue
+			if 'vertices' not in meshIndex or 'triangles' not in meshIndex:
+				raise ValueError("File invalid!")
+
+			materialNames = []
+			if 'materials' in meshIndex:
+				materialNames = parseMaterialBlock(readSection(meshIndex['materials']))
+
+			jobs.append((meshIndex['name'], materialNames,
+						convertNumbers(meshIndex['vertices'], np.float32),
+						convertNumbers(meshIndex['triangles'], np.int32)))
+
+		meshes = []
+		for meshName, materialNames, vertexJob, triangleJob in jobs:
+			vertexData = packVertexBlock(*getNumbers(vertexJob, "Vertex data invalid!"))
+			triangles = packTriangleBlock(*getNumbers(triangleJob, "Triangle data invalid!"), len(vertexData), len(materialNames))
+
+			meshes.append({'name': meshName, 'materials': materialNames, 'vertices': vertexData, 'triangles': triangles})
+
+	return skeleton, meshes
+
+# returns a process pool for parsing mesh blocks; spawned workers have to run Blender's bundled Python,
+# which older Blender versions only expose as bpy.app.binary_path_python
+def getParsePool(numBlocks):
+	context = multiprocessing.get_context('spawn')
+	context.set_executable(getattr(bpy.app, 'binary_path_python', sys.executable))
+	return concurrent.futures.ProcessPoolExecutor(max_workers=max(1, min(numBlocks, os.cpu_count() or 1)), mp_context=context)
+
+# groups the influences in the (V, 8) bone id and weight columns of a mesh by bone and by identical weight.
+# Returns the bones in the order a vertex by vertex, bone by bone scan first meets them, and a list of
+# (bone, weight, vertex indices) buckets sorted by bone and weight. Repeated influences of one bone on a
+# vertex are summed in float32 and clamped to 1, like successive VertexGroup.add(..., 'ADD') calls.
+def getVertexGroupBuckets(boneIds, boneWeights, boneCount):
+	ids = boneIds.astype(np.int64).ravel()
+	weights = (boneWeights.astype(np.float64) / 255).astype(np.float32).ravel()
+	vertices = np.repeat(np.arange(len(boneIds), dtype=np.int64), boneIds.shape[1])
+
+	valid = (ids >= 0) & (ids < boneCount)
+	ids = ids[valid]
+	weights = weights[valid]
+	vertices = vertices[valid]
+	if len(ids) == 0:
+		return [], []
+
+	# combine repeated (vertex, bone) influences in slot order
+	keys = vertices * boneCount + ids
+	order = np.argsort(keys, kind='stable')
+	keys, groups = np.unique(keys[order], return_inverse=True)
+	combined = np.zeros(len(keys), dtype=np.float32)
+	np.add.at(combined, groups, weights[order])
+	weights = np.minimum(combined, np.float32(1.0))
+	vertices = keys // boneCount
+	ids = keys % boneCount
+
+	bones, firstSeen = np.unique(ids, return_index=True)
+	boneOrder = bones[np.argsort(firstSeen)].tolist()
+
+	# split into (bone, weight) runs, vertices stay ascending within a run
+	order = np.lexsort((weights, ids))
+	ids = ids[order]
+	weights = weights[order]
+	vertices = vertices[order]
+	breaks = np.flatnonzero((ids[1:] != ids[:-1]) | (weights[1:] != weights[:-1])) + 1
+	starts = np.concatenate(([0], breaks))
+	ends = np.concatenate((breaks, [len(ids)]))
+	buckets = [(int(ids[start]), float(weights[start]), vertices[start:end]) for start, end in zip(starts, ends)]
+
+	return boneOrder, buckets
+
+# returns the size, modification time and content hash that key a sidecar cache to its source file
+def getCacheKey(path):
+	stat = os.stat(path)
+	return {'path': os.path.abspath(path), 'size': stat.st_size, 'mtime': stat.st_mtime_ns, 'hash': None}
+
+def getContentHash(path):
+	sha = hashlib.sha1()
+	with open(path, 'rb') as sourceFile:
+		for chunk in iter(lambda: sourceFile.read(1 << 20), b''):
+			sha.update(chunk)
+	return sha.hexdigest()
+
+# writes the parsed skeleton and meshes to a .cn6b sidecar: a JSON header followed by raw, 16-byte aligned arrays
+def writeCN6Cache(cachePath, key, skeleton, meshes):
+	arrays = []
+	def addArray(array):
+		arrays.append(np.ascontiguousarray(array))
+		return {'index': len(arrays) - 1, 'dtype': array.dtype.str, 'shape': list(array.shape)}
+
+	header = {
+		'source': key,
+		'skeleton': {
+			'names': skeleton['names'],
+			'parents': addArray(skeleton['parents']),
+			'positions': addArray(skeleton['positions']),
+			'quaternions': addArray(skeleton['quaternions']),
+		},
+		'meshes': [{'name': mesh['name'], 'materials': mesh['materials'],
+					'vertices': addArray(mesh['vertices']), 'triangles': addArray(mesh['triangles'])} for mesh in meshes],
+	}
+
+	# array offsets are relative to the end of the padded header
+	offsets = []
+	offset = 0
+	for array in arrays:
+		offsets.append(offset)
+		offset += (array.nbytes + 15) & ~15
+	header['offsets'] = offsets
+
+	headerData = json.dumps(header).encode('utf-8')
+	headerData += b' ' * (-(len(CACHE_MAGIC) + 8 + len(headerData)) % 16)
+
+	# a partly written sidecar is removed rather than left next to the source file
+	tempPath = cachePath + '.tmp'
+	try:
+		with open(tempPath, 'wb') as cacheFile:
+			cacheFile.write(CACHE_MAGIC)
+			cacheFile.write(struct.pack('<II', CACHE_VERSION, len(headerData)))
+			cacheFile.write(headerData)
+			for array in arrays:
+				cacheFile.write(array.tobytes())
+				cacheFile.write(b'\0' * (-array.nbytes % 16))
+		os.replace(tempPath, cachePath)
+	except:
+		if os.path.exists(tempPath):
+			os.remove(tempPath)
+		raise
+
+# memory-maps a .cn6b sidecar and returns its skeleton and meshes as array views,
+# or None when the sidecar is missing, unreadable, corrupt or does not belong to the source file any more
+def readCN6Cache(cachePath, key):
+	try:
+		with open(cachePath, 'rb') as cacheFile:
+			data = mmap.mmap(cacheFile.fileno(), 0, access=mmap.ACCESS_READ)
+	except (IOError, ValueError):
+		return None
+
+	# any damage to the sidecar is a cache miss, the source file is parsed instead
+	try:
+		cache = decodeCN6Cache(data, key)
+	except (IOError, KeyError, IndexError, TypeError, ValueError, struct.error):
+		cache = None
+
+	# on a hit the arrays keep viewing the map, which stays open for as long as they live
+	if cache is None:
+		data.close()
+	return cache
+
+# returns the skeleton and meshes of a mapped .cn6b sidecar, or None when it is stale or of another version
+def decodeCN6Cache(data, key):
+	start = len(CACHE_MAGIC) + 8
+	if data[:len(CACHE_MAGIC)] != CACHE_MAGIC:
+		return None
+	version, headerLength = struct.unpack('<II', data[len(CACHE_MAGIC):start])
+	if version != CACHE_VERSION:
+		return None
+	header = json.loads(data[start:start + headerLength].decode('utf-8'))
+
+	# an unchanged path, size and mtime is trusted as is, otherwise the content hash has to match
+	source = header['source']
+	if source['size'] != key['size']:
+		return None
+	if source['path'] != key['path'] or source['mtime'] != key['mtime']:
+		if key['hash'] is None:
+			key['hash'] = getContentHash(key['path'])
+		if source['hash'] != key['hash']:
+			return None
+
+	dataStart = start + headerLength
+	def getArray(entry):
+		dtype = np.dtype(entry['dtype'])
+		count = int(np.prod(entry['shape']))
+		offset = dataStart + header['offsets'][entry['index']]
+		return np.frombuffer(data, dtype=dtype, count=count, offset=offset).reshape(entry['shape'])
+
+	skeletonHeader = header['skeleton']
+	skeleton = {
+		'names': skeletonHeader['names'],
+		'parents': getArray(skeletonHeader['parents']),
+		'positions': getArray(skeletonHeader['positions']),
+		'quaternions': getArray(skeletonHeader['quaternions']),
+	}
+	meshes = [{'name': mesh['name'], 'materials': mesh['materials'],
+				'vertices': getArray(mesh['vertices']), 'triangles': getArray(mesh['triangles'])} for mesh in header['meshes']]
+
+	return skeleton, meshes
+
+# solves the cn6 skeleton table for all bones at once. Converts the quaternions to (transposed) rotation
+# matrices, accumulates world rotations and heads level by level down the parent hierarchy, and returns
+# the (B, 3) heads and the (B, 4, 4) bone matrices before the roll fix. Raises ValueError on parent cycles.
+def solveSkeleton(skeleton):
+	parents = np.asarray(skeleton['parents'], dtype=np.int64)
+	positions = np.asarray(skeleton['positions'], dtype=np.float64)
+	boneCount = len(parents)
+
+	# Granny Rotation Quaternions are stored X,Y,Z,W. The matrices are transposed to get same behaviour as 2.49 script
+	x, y, z, w = np.asarray(skeleton['quaternions'], dtype=np.float64).reshape(-1, 4).T
+	rotations = np.empty((boneCount, 3, 3))
+	rotations[:, 0, 0] = 1 - 2 * (y * y + z * z)
+	rotations[:, 0, 1] = 2 * (x * y + w * z)
+	rotations[:, 0, 2] = 2 * (x * z - w * y)
+	rotations[:, 1, 0] = 2 * (x * y - w * z)
+	rotations[:, 1, 1] = 1 - 2 * (x * x + z * z)
+	rotations[:, 1, 2] = 2 * (y * z + w * x)
+	rotations[:, 2, 0] = 2 * (x * z + w * y)
+	rotations[:, 2, 1] = 2 * (y * z - w * x)
+	rotations[:, 2, 2] = 1 - 2 * (x * x + y * y)
+
+	# heads and rotations of child bones are relative to their parent's (row vector convention)
+	heads = positions.copy()
+	hasParent = (parents >= 0) & (parents < boneCount)
+	parentIndices = np.where(hasParent, parents, 0)
+	solved = ~hasParent
+	while not solved.all():
+		ready = np.flatnonzero(~solved & solved[parentIndices])
+		if len(ready) == 0:
+			raise ValueError
+		readyParents = parentIndices[ready]
+		heads[ready] = np.einsum('ni,nij->nj', positions[ready], rotations[readyParents]) + heads[readyParents]
+		rotations[ready] = np.matmul(rotations[ready], rotations[readyParents])
+		solved[ready] = True
+
+	# Blender bone axes are x = -row 1, y = row 0, z = row 2 of the world rotation
+	matrices = np.zeros((boneCount, 4, 4))
+	matrices[:, 0:3, 0] = -rotations[:, 1, :]
+	matrices[:, 0:3, 1] = rotations[:, 0, :]
+	matrices[:, 0:3, 2] = rotations[:, 2, :]
+	matrices[:, 0:3, 3] = heads
+	matrices[:, 3, 3] = 1
+
+	return heads, matrices
+
+# keeps the imported normal, tangent and binormal of every vertex for re-export: the frames are stored as one
+# float32 array property in original vertex order, and each vertex's original index as an integer point
+# attribute, which follows the vertex through edits. Blender versions without mesh attributes fall back
+# to encoding the index in the weight of a VERTEX_KEYS vertex group.
+def storeOriginalFrames(meshOb, mesh, frames):
+	if hasattr(mesh, 'attributes'):
+		attribute = mesh.attributes.new(ORIGINAL_INDEX_ATTRIBUTE, 'INT', 'POINT')
+		# stored one based, as vertices added later (extrude, join, duplicate) get 0
+		attribute.data.foreach_set("value", np.arange(1, len(mesh.vertices) + 1, dtype=np.int32))
+		mesh[ORIGINAL_FRAMES_PROPERTY] = np.ascontiguousarray(frames, dtype=np.float32).ravel()
+		return
+
+	originalTangentsBinormals = {}
+	meshOb.vertex_groups.new(name="VERTEX_KEYS")
+	keyVertexGroup = meshOb.vertex_groups.get("VERTEX_KEYS")
+
+	for v, vertex in enumerate(mesh.vertices):
+		encoded_weight = (v / 2000000)
+		keyVertexGroup.add([v], encoded_weight, 'ADD')
+		originalTangentsBinormals[str(v)] = frames[v].tolist()
+
+	mesh['originalTangentsBinormals'] = originalTangentsBinormals
+
+# records the wall time, tracemalloc peak and counts of the named phases of an import or export, and writes
+# them as a JSON report and optionally a Chrome trace (chrome://tracing or Perfetto) next to the processed file
+# each add-on installs as a single file, so this class is kept identical in io_export_cn6.py, io_import_na2.py
+# and the 2.7 io_batch_cn6_to_cn6.py and io_export_br2.py; change all copies together
+class PhaseProfile:
+	def __init__(self, enabled=False):
+		self.enabled = enabled
+		self.phases = []
+		self.current = None
+		self.startTime = time.perf_counter()
+		self.ownsTracemalloc = enabled and not tracemalloc.is_tracing()
+		if self.ownsTracemalloc:
+			tracemalloc.start()
+
+	# ends the current phase and starts the named one
+	def begin(self, name, **counts):
+		if not self.enabled:
+			return
+		self.end()
+		if hasattr(tracemalloc, 'reset_peak'):
+			tracemalloc.reset_peak()
+		self.current = {'name': name, 'start': time.perf_counter(), 'counts': {}}
+		self.count(**counts)
+
+	# adds to the counts (verts, loops, bones, keys...) of the current phase
+	def count(self, **counts):
+		if self.current is None:
+			return
+		phaseCounts = self.current['counts']
+		for key, value in counts.items():
+			phaseCounts[key] = phaseCounts.get(key, 0) + int(value)
+
+	def end(self):
+		if self.current is None:
+			return
+		phase = self.current
+		phase['seconds'] = time.perf_counter() - phase['start']
+		phase['start'] = phase['start'] - self.startTime
+		phase['peakBytes'] = tracemalloc.get_traced_memory()[1] if tracemalloc.is_tracing() else None
+		self.phases.append(phase)
+		self.current = None
+
+	# ends profiling and writes <path>.profile.json, and <path>.trace.json with chromeTrace
+	def write(self, path, chromeTrace=False):
+		if not self.enabled:
+			return
+		self.end()
+		totalSeconds = time.perf_counter() - self.startTime
+		if self.ownsTracemalloc:
+			tracemalloc.stop()
+			self.ownsTracemalloc = False
+
+		# repeated phases, such as one per mesh, are summed up
+		totals = {}
+		for phase in self.phases:
+			total = totals.setdefault(phase['name'], {'calls': 0, 'seconds': 0.0, 'peakBytes': None, 'counts': {}})
+			total['calls'] += 1
+			total['seconds'] += phase['seconds']
+			if phase['peakBytes'] is not None:
+				total['peakBytes'] = max(total['peakBytes'] or 0, phase['peakBytes'])
+			for key, value in phase['counts'].items():
+				total['counts'][key] = total['counts'].get(key, 0) + value
+
+		report = {'file': path, 'seconds': totalSeconds, 'phases': totals, 'timeline': self.phases}
+		with open(path + '.profile.json', 'w') as file:
+			json.dump(report, file, indent=1)
+		log.info("Profile written to %s.profile.json", path)
+
+		if chromeTrace:
+			events = []
+			for phase in self.phases:
+				args = dict(phase['counts'])
+				args['peakBytes'] = phase['peakBytes']
+				events.append({'name': phase['name'], 'ph': 'X', 'pid': os.getpid(), 'tid': 0,
+					'ts': phase['start'] * 1e6, 'dur': phase['seconds'] * 1e6, 'args': args})
+			with open(path + '.trace.json', 'w') as file:
+				json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, file)
+			log.info("Chrome trace written to %s.trace.json", path)
+
+def do_import(path, DELETE_TOP_BONE=True, USE_CACHE=True, MESH_NAMES=None, SKELETON_ONLY=False, PARALLEL_PARSE=False, VERBOSITY='SUMMARY', PROFILE=False, CHROME_TRACE=False):
+	setVerbosity(VERBOSITY)
+	log.info("Importing %s", path)
+
+	profile = PhaseProfile(PROFILE)
+	try:
+		return importCN6(path, DELETE_TOP_BONE, USE_CACHE, MESH_NAMES, SKELETON_ONLY, PARALLEL_PARSE, profile)
+	finally:
+		profile.write(path, CHROME_TRACE)
 
+def importCN6(path, DELETE_TOP_BONE, USE_CACHE, MESH_NAMES, SKELETON_ONLY, PARALLEL_PARSE, profile):
 	# get scene
 	scn = bpy.context.scene
 	if scn==None:
@@ -78,6 +618,7 @@ def do_import(path, DELETE_TOP_BONE=True):
 		file = open(path, 'r')
 	except IOError:
 		return "Failed to open the file!"
+	file.close()
 	
 	try:
 		if not path.endswith(".cn6"):
@@ -85,11 +626,65 @@ def do_import(path, DELETE_TOP_BONE=True):
 	except IOError:
 		return "Must be an cn6 file!"
 
-	# Load Armature
+	# Meshes to load, None for all of them
+	meshNames = None
+	if SKELETON_ONLY:
+		meshNames = []
+	elif MESH_NAMES:
+		meshNames = MESH_NAMES
+
+	# Load skeleton and meshes, from the binary sidecar if it is still valid
+	profile.begin("read")
+	cached = None
+	if USE_CACHE:
+		cachePath = path + 'b'
+		key = getCacheKey(path)
+		cached = readCN6Cache(cachePath, key)
+
+	if cached:
+		log.info("Using cache %s", cachePath)
+		skeleton, meshData = cached
+		if meshNames is not None:
+			meshData = [mesh for mesh in meshData if mesh['name'] in meshNames]
+	else:
+		index = indexCN6(path)
+		try:
+			if PARALLEL_PARSE and len(index['meshes']) > 1:
+				try:
+					with getParsePool(2 * len(index['meshes'])) as executor:
+						skeleton, meshData = readCN6(path, index, meshNames, executor)
+				except concurrent.futures.process.BrokenProcessPool:
+					log.warning("Parse workers failed, parsing on the main thread")
+					skeleton, meshData = readCN6(path, index, meshNames)
+			else:
+				skeleton, meshData = readCN6(path, index, meshNames)
+		except ValueError as e:
+			if e.args:
+				return e.args[0]
+			raise
+
+		# Only complete reads are cached
+		if USE_CACHE and meshNames is None:
+			try:
+				if key['hash'] is None:
+					key['hash'] = getContentHash(path)
+				writeCN6Cache(cachePath, key, skeleton, meshData)
+			except (IOError, OSError):
+				log.warning("Could not write cache %s", cachePath)
+
+	# a misspelt name would otherwise just leave its mesh out
+	if meshNames:
+		foundNames = set(mesh['name'] for mesh in meshData)
+		missingNames = [name for name in meshNames if name not in foundNames]
+		if missingNames:
+			log.warning("Meshes not found in %s: %s", path, ", ".join(missingNames))
+
+	profile.count(meshes=len(meshData), verts=sum(len(mesh['vertices']) for mesh in meshData), triangles=sum(len(mesh['triangles']) for mesh in meshData))
+
+	# Solve the skeleton before any Blender data is created
+	profile.begin("skeleton", bones=len(skeleton['names']))
 	try:
-		lines = getNextLine(file).split()
-		if len(lines) != 1 or lines[0] != "skeleton":
-			raise ValueError
+		boneHeads, boneMatrices = solveSkeleton(skeleton)
 	except ValueError:
 		return "File invalid!"
 
@@ -103,195 +698,76 @@ def do_import(path, DELETE_TOP_BONE=True):
 	scn.collection.objects.link(armOb)
 	bpy.context.view_layer.objects.active = armOb
 
-	# read bones
-	boneNames = []
+	# create bones, then set parents, positions and orientations in a single pass
 	bpy.ops.object.editmode_toggle()
-	bpy.types.EditBone.rot_matrix = bpy.props.FloatVectorProperty(name="Rot Matrix", size=9)
 
-	currentLine = ""
+	boneNames = skeleton['names']
+	parentBoneIds = skeleton['parents']
+	boneCount = len(boneNames)
 
-	boneCount = 0
-	boneNameDict = []
-	parentBoneIds = []
-	positions = []
-	quaternions = []
+	log.info("%d bones", boneCount)
+	log.debug("Bones: %s", boneNames)
+	editBones = [armature.edit_bones.new(name) for name in boneNames]
 
-	while(not currentLine.startswith('meshes')):
-		currentLine = getNextLine(file)
-
-		if (not currentLine.startswith('meshes')):
-			lines = shlex.split(currentLine)
-			boneNameDict.append(lines[1])
-			parentBoneIds.append(int(lines[2]))
-			positions.append([float(lines[3]), float(lines[4]), float(lines[5])])
-			quaternions.append([float(lines[6]), float(lines[7]), float(lines[8]), float(lines[9])])
-			boneCount = boneCount + 1
-
-	print (boneNameDict)
-	for i in range(boneCount):
-		# read name
-		fullName = boneNameDict[i]
-		boneNames.append(fullName)
-		bone = armature.edit_bones.new(fullName)
-
-		# read parent
-		if parentBoneIds[i] >= 0:
-			parentBoneName = boneNameDict[parentBoneIds[i]] #getNextLine(file)[1:-1]
-			bone.parent = armature.bones.data.edit_bones[parentBoneName]
-
-		pos = positions[i]
-		quat = quaternions[i]
-
-		# Granny Rotation Quaternions are stored X,Y,Z,W but Blender uses W,X,Y,Z
-		quaternion = Quaternion((quat[3], quat[0], quat[1], quat[2]))
-		rotMatrix = quaternion.to_matrix()
-		rotMatrix.transpose() # Need to transpose to get same behaviour as 2.49 script
-
-		print ("Bone Data")
-		print (fullName)
-		print (pos)
-		print (rotMatrix)
-
-		boneLength = 3
-		# set position and orientation
-		if bone.parent:
-			bone_parent_matrix = Matrix([[bone.parent.rot_matrix[0], bone.parent.rot_matrix[1], bone.parent.rot_matrix[2]],
-										[bone.parent.rot_matrix[3], bone.parent.rot_matrix[4], bone.parent.rot_matrix[5]],
-										[bone.parent.rot_matrix[6], bone.parent.rot_matrix[7], bone.parent.rot_matrix[8]]])
-			bone.head =  Vector(pos) @ bone_parent_matrix + bone.parent.head
-			bone.tail = bone.head + Vector([boneLength,0,0])
-			tempM = rotMatrix @ bone_parent_matrix
-			bone.rot_matrix = [tempM[0][0], tempM[0][1], tempM[0][2],
-								tempM[1][0], tempM[1][1], tempM[1][2],
-								tempM[2][0], tempM[2][1], tempM[2][2]]
-			bone.matrix = Matrix([[-bone.rot_matrix[3], bone.rot_matrix[0], bone.rot_matrix[6], bone.head[0]],
-								 [-bone.rot_matrix[4], bone.rot_matrix[1], bone.rot_matrix[7], bone.head[1]],
-								 [-bone.rot_matrix[5], bone.rot_matrix[2], bone.rot_matrix[8], bone.head[2]],
-								 [0, 0, 0, 1]])
-		else:
-			bone.head = Vector(pos)
-			bone.tail = bone.head + Vector([boneLength,0,0])
-			bone.rot_matrix = [rotMatrix[0][0], rotMatrix[0][1], rotMatrix[0][2],
-								rotMatrix[1][0], rotMatrix[1][1], rotMatrix[1][2],
-								rotMatrix[2][0], rotMatrix[2][1], rotMatrix[2][2]]
-			bone.matrix = Matrix([[-bone.rot_matrix[3], bone.rot_matrix[0], bone.rot_matrix[6], bone.head[0]],
-								 [-bone.rot_matrix[4], bone.rot_matrix[1], bone.rot_matrix[7], bone.head[1]],
-								 [-bone.rot_matrix[5], bone.rot_matrix[2], bone.rot_matrix[8], bone.head[2]],
-								 [0, 0, 0, 1]])
-
-	# Roll fix for all bones
-	for bone in armature.bones.data.edit_bones:
-		roll = bone.roll
-		bone.roll = roll - radians(90.0)
+	boneLength = 3
+	for i, bone in enumerate(editBones):
+		if 0 <= parentBoneIds[i] < boneCount:
+			bone.parent = editBones[parentBoneIds[i]]
 
-	# read the number of meshes
-	try:
-		lines = currentLine
-		if not lines.startswith('meshes:'):
-			raise ValueError
-		numMeshes = int(lines.replace('meshes:',''))
-		if numMeshes < 0:
-			raise ValueError
-	except ValueError:
-		return "Number of meshes is invalid!"
+		head = Vector(boneHeads[i])
+		bone.head = head
+		bone.tail = head + Vector([boneLength,0,0])
+		bone.matrix = Matrix(boneMatrices[i].tolist())
+
+		# Roll fix
+		bone.roll = bone.roll - radians(90.0)
 
 	# read meshes
-	boneIds = [[],[],[],[],[],[],[],[]]
-	boneWeights = [[],[],[],[],[],[],[],[]]
-	meshVertexGroups = {}
-	vCount = 0
+	numMeshes = len(meshData)
+	boneIds = []
+	boneWeights = []
 	
 	meshes = []
 	meshObjects = []
 
-	print('Num Meshes')
-	print(numMeshes)
+	log.info("%d meshes", numMeshes)
 
 	for i in range(numMeshes):
+		profile.begin("mesh geometry", verts=len(meshData[i]['vertices']), loops=3 * len(meshData[i]['triangles']))
 
-		while(not currentLine.startswith('mesh:')):
-			currentLine = getNextLine(file)
+		meshName = meshData[i]['name'] + '#M'
+		meshes.append(bpy.data.meshes.new(meshName))
 
-		lines = currentLine.split(':')
+		materialNames = meshData[i]['materials']
 
-		meshName = lines[1][1:-1] + '#M'
-		meshes.append(bpy.data.meshes.new(meshName))
+		log.debug("%s materials: %s", meshName, materialNames)
 
-		# read materials
-		materialNames = []
-		while(not currentLine.startswith('vertices')):
-			currentLine = getNextLine(file)
-			if (not currentLine.startswith('materials') and not currentLine.startswith('vertices')):
-				materialNames.append(currentLine[1:-1])
-
-		print ("materialNames")
-		print (materialNames)
-
-		# read vertices
-		coords = []
-		normals = []
-		tangents = []
-		binormals = []
-		uvs = []
-		uvs2 = []
-		uvs3 = []
-		numVerts = 0
-		normalsTangentsBinormals = []
-		originalTangentsBinormals = {}
+		vertexData = meshData[i]['vertices']
+		numVerts = len(vertexData)
 
-		nonMatchingNormalTangentBinormal = True
+		# column views into the packed vertex array
+		coords = vertexData[:, 0:3]
+		normals = vertexData[:, 3:6]
+		normalsTangentsBinormals = vertexData[:, 3:12]
+		boneIds.append(vertexData[:, 18:26])
+		boneWeights.append(vertexData[:, 26:34])
 
-		while(not currentLine.startswith('triangles')):
-			currentLine = getNextLine(file)
-			if (not currentLine.startswith('vertices') and not currentLine.startswith('triangles')):
-				lines = currentLine.split()
-				if len(lines) != 34:
-					raise ValueError
-				coords.append([float(lines[0]), float(lines[1]), float(lines[2])])
-				normals.append([float(lines[3]), float(lines[4]), float(lines[5])])
-				tangents.append([float(lines[6]), float(lines[7]), float(lines[8])])
-				binormals.append([float(lines[9]), float(lines[10]), float(lines[11])])
-
-				if (numVerts < 10):
-					#print("Normal/Tangent/Binormal Check")
-					#print(abs(float(lines[3]) - float(lines[6])))
-					#print(abs(float(lines[4]) - float(lines[7])))
-					#print(abs(float(lines[5]) - float(lines[8])))
-					if (abs(float(lines[3]) - float(lines[6])) < 0.000001 and abs(float(lines[4]) - float(lines[7])) < 0.000001 and abs(float(lines[5]) - float(lines[8])) < 0.000001 and
-						abs(float(lines[3]) - float(lines[9])) < 0.000001 and abs(float(lines[4]) - float(lines[10])) < 0.000001 and abs(float(lines[5]) - float(lines[11])) < 0.000001):
-						nonMatchingNormalTangentBinormal = False
-					else:
-						nonMatchingNormalTangentBinormal = True
-
-				uvs.append([float(lines[12]), 1-float(lines[13])])
-				uvs2.append([float(lines[14]), 1-float(lines[15])])
-				uvs3.append([float(lines[16]), 1-float(lines[17])])
-
-				normalsTangentsBinormals.append([float(lines[3]), float(lines[4]), float(lines[5]), float(lines[6]), float(lines[7]), float(lines[8]), float(lines[9]), float(lines[10]), float(lines[11])])
-
-				boneIds[0].append(int(lines[18]))
-				boneIds[1].append(int(lines[19]))
-				boneIds[2].append(int(lines[20]))
-				boneIds[3].append(int(lines[21]))
-				boneIds[4].append(int(lines[22]))
-				boneIds[5].append(int(lines[23]))
-				boneIds[6].append(int(lines[24]))
-				boneIds[7].append(int(lines[25]))
-
-				boneWeights[0].append(float(lines[26]))
-				boneWeights[1].append(float(lines[27]))
-				boneWeights[2].append(float(lines[28]))
-				boneWeights[3].append(float(lines[29]))
-				boneWeights[4].append(float(lines[30]))
-				boneWeights[5].append(float(lines[31]))
-				boneWeights[6].append(float(lines[32]))
-				boneWeights[7].append(float(lines[33]))
-
-				meshVertexGroups[vCount] = meshName     # uses the long mesh name - may be > 21 chars
-				numVerts += 1
-		
-		meshes[i].vertices.add(len(coords))
-		meshes[i].vertices.foreach_set("co", unpack_list(coords))
+		uvData = vertexData[:, 12:18].copy()
+		uvData[:, 1::2] = 1 - uvData[:, 1::2]
+		uvs = uvData[:, 0:2]
+		uvs2 = uvData[:, 2:4]
+		uvs3 = uvData[:, 4:6]
+
+		# the last of the first ten vertices decides whether normals, tangents and binormals differ
+		nonMatchingNormalTangentBinormal = True
+		if numVerts > 0:
+			sample = vertexData[min(numVerts, 10) - 1]
+			if (np.all(np.abs(sample[3:6] - sample[6:9]) < 0.000001) and
+				np.all(np.abs(sample[3:6] - sample[9:12]) < 0.000001)):
+				nonMatchingNormalTangentBinormal = False
+
+		meshes[i].vertices.add(numVerts)
+		meshes[i].vertices.foreach_set("co", coords.ravel())
 		meshOb = bpy.data.objects.new(meshName, meshes[i])
 
 		for materialName in materialNames:
@@ -305,79 +781,42 @@ def do_import(path, DELETE_TOP_BONE=True):
 				meshOb.data.materials.append(material)
 
 		if (nonMatchingNormalTangentBinormal):
-			meshOb.vertex_groups.new(name="VERTEX_KEYS")
-			keyVertexGroup = meshOb.vertex_groups.get("VERTEX_KEYS")
-
-			for v, vertex in enumerate(meshes[i].vertices):
-				encoded_weight = (v / 2000000)
-				keyVertexGroup.add([v], encoded_weight, 'ADD')
-				#print ("encoded_weight {}".format(encoded_weight))
-				#print ("vertex.bevel_weight {}".format(vertex.groups[keyVertexGroup.index].weight))
-				originalTangentsBinormals[str(v)] = normalsTangentsBinormals[v]
-
-		meshes[i]['originalTangentsBinormals'] = originalTangentsBinormals
-
-		# read triangles
-		faces = []
-		while (not currentLine.startswith('mesh:') and not currentLine.startswith('end')):
-			# read the triangle
-			currentLine = getNextLine(file)
-			if (not currentLine.startswith('mesh:') and not currentLine.startswith('end')):
-				lines = currentLine.split()
-				if len(lines) != 4: # Fourth element is material index
-					raise ValueError
-				v1 = int(lines[0])
-				v2 = int(lines[1])
-				v3 = int(lines[2])
-				mi = int(lines[3])
-
-			if v1 < numVerts and v2 < numVerts and v3 < numVerts and mi < len(materialNames):
-				faces.append([v1,v2,v3,mi])
+			storeOriginalFrames(meshOb, meshes[i], normalsTangentsBinormals)
+
+		triangles = meshData[i]['triangles']
+		numFaces = len(triangles)
 
 		# Create Meshes and import Normals
 		mesh = meshes[i]
-		mesh.loops.add(len(faces) * 3)
-		mesh.polygons.add(len(faces))
-
-		loops_vert_idx = []
-		faces_loop_start = []
-		faces_loop_total = []
-		faces_material_index = []
-		lidx = 0
-		for f in faces:
-			vidx = [f[0],f[1],f[2]]
-			nbr_vidx = len(vidx)
-			loops_vert_idx.extend(vidx)
-			faces_loop_start.append(lidx)
-			faces_loop_total.append(nbr_vidx)
-			faces_material_index.append(f[3])
-			lidx += nbr_vidx
-
-		mesh.loops.foreach_set("vertex_index", loops_vert_idx)
-		mesh.polygons.foreach_set("loop_start", faces_loop_start)
-		mesh.polygons.foreach_set("loop_total", faces_loop_total)
-		mesh.polygons.foreach_set("material_index", faces_material_index)
-
-		mesh.create_normals_split()
+		mesh.loops.add(numFaces * 3)
+		mesh.polygons.add(numFaces)
+
+		loopVertexIndices = triangles[:, 0:3].ravel()
+		mesh.loops.foreach_set("vertex_index", loopVertexIndices)
+		mesh.polygons.foreach_set("loop_start", np.arange(0, numFaces * 3, 3, dtype=np.int32))
+		mesh.polygons.foreach_set("loop_total", np.full(numFaces, 3, dtype=np.int32))
+		mesh.polygons.foreach_set("material_index", np.ascontiguousarray(triangles[:, 3]))
 
 		mesh.uv_layers.new(name='UV1')
 		mesh.uv_layers.new(name='UV2')
 		mesh.uv_layers.new(name='UV3')
 
-		for l in mesh.loops:
-			l.normal[:] = normals[l.vertex_index]
-			mesh.uv_layers[0].data[l.index].uv = uvs[l.vertex_index]
-			mesh.uv_layers[1].data[l.index].uv = uvs2[l.vertex_index]
-			mesh.uv_layers[2].data[l.index].uv = uvs3[l.vertex_index]
+		# per-loop UVs are the per-vertex UVs gathered through the loop vertex indices
+		mesh.uv_layers[0].data.foreach_set("uv", uvs[loopVertexIndices].ravel())
+		mesh.uv_layers[1].data.foreach_set("uv", uvs2[loopVertexIndices].ravel())
+		mesh.uv_layers[2].data.foreach_set("uv", uvs3[loopVertexIndices].ravel())
 
 		mesh.validate(clean_customdata=False)
 
-		clnors = array.array('f', [0.0] * (len(mesh.loops) * 3))
-		mesh.loops.foreach_get("normal", clnors)
+		# validate may drop faces, so custom normals are gathered for the loops that are left
+		profile.begin("custom normals", loops=len(mesh.loops))
+		loopVertexIndices = np.empty(len(mesh.loops), dtype=np.int32)
+		mesh.loops.foreach_get("vertex_index", loopVertexIndices)
+		clnors = normals[loopVertexIndices]
 
 		mesh.polygons.foreach_set("use_smooth", [True] * len(mesh.polygons))
 
-		mesh.normals_split_custom_set(tuple(zip(*(iter(clnors),) * 3)))
+		mesh.normals_split_custom_set(clnors)
 		mesh.use_auto_smooth = True
 
 		#mesh.free_normals_split()
@@ -386,25 +825,23 @@ def do_import(path, DELETE_TOP_BONE=True):
 		meshObjects.append(meshOb)
 		scn.collection.objects.link(meshObjects[i])
 			
+	profile.begin("mesh update", meshes=len(meshes))
 	for mesh in meshes:
 		mesh.update()
 
 	# Create Vertex Groups
-	vi = 0
-	for meshOb in meshObjects:
+	profile.begin("vertex groups")
+	for mi, meshOb in enumerate(meshObjects):
 		mesh = meshOb.data
-		for mvi, vertex in enumerate(mesh.vertices):
-			for bi in range(boneCount):
-				for j in range(8):
-					if bi==boneIds[j][vi]:
-						name = boneNames[bi] 
-						if not meshOb.vertex_groups.get(name):
-							meshOb.vertex_groups.new(name=name)
-						grp = meshOb.vertex_groups.get(name)
-						normalizedWeight = boneWeights[j][vi] / 255
-						grp.add([mvi], normalizedWeight, 'ADD')
-						#print('Vertex: %d; Index: %d; Bone: %s; Weight: %f; ' % (mvi, j, name, normalizedWeight))
-			vi = vi + 1
+		boneOrder, buckets = getVertexGroupBuckets(boneIds[mi], boneWeights[mi], boneCount)
+		for bi in boneOrder:
+			name = boneNames[bi]
+			if not meshOb.vertex_groups.get(name):
+				meshOb.vertex_groups.new(name=name)
+		for bi, weight, vertexIndices in buckets:
+			grp = meshOb.vertex_groups.get(boneNames[bi])
+			grp.add(vertexIndices.tolist(), weight, 'ADD')
+			profile.count(weights=len(vertexIndices))
 		
 		# Give mesh object an armature modifier, using vertex groups but not envelopes
 		mod = meshOb.modifiers.new('mod_' + mesh.name, 'ARMATURE')
@@ -414,13 +851,14 @@ def do_import(path, DELETE_TOP_BONE=True):
 		# Parent Mesh Object to Armature Object
 		meshOb.parent = armOb
 
+	profile.begin("finish")
 	if DELETE_TOP_BONE:
 		# Adjust object names, remove top bone for Civ V
 		bone = armature.bones.data.edit_bones[boneNames[0]]
 		while not bone.parent is None:
 			bone = bone.parent
 		
-		print ('Found World Bone: %s' % bone.name)
+		log.info('Found World Bone: %s', bone.name)
 		
 		name = bone.name
 		armOb.name = name
@@ -443,13 +881,22 @@ class Import_nb2(bpy.types.Operator, ImportHelper):
 	bl_description= "Import a CivNexus6 .cn6 file"
 
 	filename_ext = ".cn6"
-	filter_glob = StringProperty(default="*.cn6", options={'HIDDEN'})
-
-	filepath = StringProperty(name="File Path",description="Filepath used for importing the file",maxlen=1024,subtype='FILE_PATH')
-	DELETE_TOP_BONE= BoolProperty(name="Delete Top Bone", description="Delete Top Bone", default=True)
+	filter_glob: StringProperty(default="*.cn6", options={'HIDDEN'})
+
+	filepath: StringProperty(name="File Path",description="Filepath used for importing the file",maxlen=1024,subtype='FILE_PATH')
+	DELETE_TOP_BONE: BoolProperty(name="Delete Top Bone", description="Delete Top Bone", default=True)
+	USE_CACHE: BoolProperty(name="Use Binary Cache", description="Write a .cn6b sidecar next to the file and load from it while the file is unchanged", default=True)
+	MESH_NAMES: StringProperty(name="Meshes", description="Comma separated names of the meshes to import, all meshes if empty", default="")
+	SKELETON_ONLY: BoolProperty(name="Skeleton Only", description="Import only the skeleton", default=False)
+	PARALLEL_PARSE: BoolProperty(name="Parallel Parsing", description="Parse mesh blocks in separate processes, one per CPU core", default=False)
+	VERBOSITY: EnumProperty(name="Verbosity", description="Amount of console output", items=VERBOSITY_ITEMS, default='SUMMARY')
+	PROFILE: BoolProperty(name="Write Profile", description="Write the time, memory peak and counts of each import phase to a .profile.json file next to the .cn6", default=False)
+	CHROME_TRACE: BoolProperty(name="Write Chrome Trace", description="With Write Profile, also write a .trace.json file for chrome://tracing", default=False)
 
 	def execute(self, context):
-		do_import(self.filepath, self.DELETE_TOP_BONE)
+		meshNames = [name.strip() for name in self.MESH_NAMES.split(',') if name.strip()]
+		meshNames = [name[:-2] if name.endswith('#M') else name for name in meshNames]
+		do_import(self.filepath, self.DELETE_TOP_BONE, self.USE_CACHE, meshNames, self.SKELETON_ONLY, self.PARALLEL_PARSE, self.VERBOSITY, self.PROFILE, self.CHROME_TRACE)
 		return {'FINISHED'}
 
 def menu_func(self, context):
@@ -10,7 +10,14 @@ bl_info = {
     "category": "Import-Export"}
 
 import bpy
-from bpy.props import BoolProperty, IntProperty, EnumProperty, StringProperty
+import os
+import sys
+import json
+import time
+import tracemalloc
+import logging
+import numpy as np
+from bpy.props import BoolProperty, IntProperty, FloatProperty, EnumProperty, StringProperty
 from mathutils import Vector, Quaternion, Matrix
 from bpy_extras.io_utils import ImportHelper
 from datetime import datetime, timedelta
@@ -21,6 +28,36 @@ EVENT_EXIT = 1
 EVENT_REDRAW = 2
 EVENT_FILESEL = 3
 
+# animation import messages, logged under civ_blender like the cn6 add-ons
+LOG_NAME = "civ_blender"
+log = logging.getLogger(LOG_NAME + "." + __name__)
+
+VERBOSITY_ITEMS = (
+    ('QUIET', "Quiet", "Warnings only"),
+    ('SUMMARY', "Summary", "Totals per file, mesh and animation"),
+    ('DEBUG', "Debug", "Everything, including per bone, vertex and frame detail"),
+)
+VERBOSITY_LEVELS = {'QUIET': logging.WARNING, 'SUMMARY': logging.INFO, 'DEBUG': logging.DEBUG}
+
+ROTATION_MODE_ITEMS = (
+    ('QUATERNION', "Quaternion", "Key rotation_quaternion"),
+    ('XYZ', "XYZ Euler", "Key rotation_euler, kept compatible from frame to frame"),
+)
+
+# value of the 'LINEAR' keyframe interpolation when set through foreach_set
+LINEAR_INTERPOLATION = 1
+
+
+# sends the shared add-on logger to the console at the given verbosity
+def setVerbosity(verbosity):
+    addonLog = logging.getLogger(LOG_NAME)
+    if not addonLog.handlers:
+        handler = logging.StreamHandler(sys.stdout)
+        handler.setFormatter(logging.Formatter("%(name)s: %(message)s"))
+        addonLog.addHandler(handler)
+        addonLog.propagate = False
+    addonLog.setLevel(VERBOSITY_LEVELS[verbosity])
+
 
 # Converts ms3d euler angles to a rotation matrix
 def RM(a):
@@ -55,7 +92,7 @@ def getNextLine(file):
     while ready == False:
         line = file.readline()
         if len(line) == 0:
-            print("Warning: End of file reached.")
+            log.warning("End of file reached.")
             return line
         ready = True
         line = line.strip()
@@ -66,9 +103,398 @@ def getNextLine(file):
     return line
 
 
-def import_na2(path):
-    print("START NA2 IMPORT...")
+# converts (..., 4, 4) na2 frame matrices into armature space pose matrices; the rows of a na2 matrix hold
+# the bone's y, z and x axes and its position
+def getPoseMatrices(frames):
+    poseMatrices = np.zeros(frames.shape, dtype=np.float64)
+    poseMatrices[..., 0:3, 0] = frames[..., 2, 0:3]
+    poseMatrices[..., 0:3, 1] = frames[..., 0, 0:3]
+    poseMatrices[..., 0:3, 2] = frames[..., 1, 0:3]
+    poseMatrices[..., 0:3, 3] = frames[..., 3, 0:3]
+    poseMatrices[..., 3, 3] = 1.0
+    return poseMatrices
+
+
+# converts (N, 3, 3) rotation matrices into (N, 4) w, x, y, z quaternions, picking for every matrix the
+# numerically stable branch of the trace and diagonal
+def matricesToQuaternions(matrices):
+    m = matrices
+    trace = m[:, 0, 0] + m[:, 1, 1] + m[:, 2, 2]
+    quaternions = np.empty((len(m), 4), dtype=np.float64)
+
+    branch = np.argmax(np.stack([trace, m[:, 0, 0], m[:, 1, 1], m[:, 2, 2]], axis=1), axis=1)
+
+    i = branch == 0
+    s = 2.0 * np.sqrt(np.maximum(1.0 + trace[i], 1e-12))
+    quaternions[i] = np.stack([0.25 * s, (m[i, 2, 1] - m[i, 1, 2]) / s, (m[i, 0, 2] - m[i, 2, 0]) / s,
+                               (m[i, 1, 0] - m[i, 0, 1]) / s], axis=1)
+    i = branch == 1
+    s = 2.0 * np.sqrt(np.maximum(1.0 + m[i, 0, 0] - m[i, 1, 1] - m[i, 2, 2], 1e-12))
+    quaternions[i] = np.stack([(m[i, 2, 1] - m[i, 1, 2]) / s, 0.25 * s, (m[i, 0, 1] + m[i, 1, 0]) / s,
+                               (m[i, 0, 2] + m[i, 2, 0]) / s], axis=1)
+    i = branch == 2
+    s = 2.0 * np.sqrt(np.maximum(1.0 - m[i, 0, 0] + m[i, 1, 1] - m[i, 2, 2], 1e-12))
+    quaternions[i] = np.stack([(m[i, 0, 2] - m[i, 2, 0]) / s, (m[i, 0, 1] + m[i, 1, 0]) / s, 0.25 * s,
+                               (m[i, 1, 2] + m[i, 2, 1]) / s], axis=1)
+    i = branch == 3
+    s = 2.0 * np.sqrt(np.maximum(1.0 - m[i, 0, 0] - m[i, 1, 1] + m[i, 2, 2], 1e-12))
+    quaternions[i] = np.stack([(m[i, 1, 0] - m[i, 0, 1]) / s, (m[i, 0, 2] + m[i, 2, 0]) / s,
+                               (m[i, 1, 2] + m[i, 2, 1]) / s, 0.25 * s], axis=1)
+
+    # same rotation, with w >= 0 as Blender gives it
+    quaternions[quaternions[:, 0] < 0] *= -1
+    return quaternions / np.linalg.norm(quaternions, axis=1)[:, None]
+
+
+# returns the (F, 3) location and (F, 4) rotation_quaternion that give a pose bone the (F, 4, 4) armature
+# space pose matrices, the same values Blender stores when poseBone.matrix is set. The parent's pose is
+# either (F, 4, 4) or a single (4, 4) matrix, and None for bones without a parent.
+def getLocalTransforms(restMatrix, poseMatrices, parentRestMatrix=None, parentPoseMatrices=None):
+    if parentRestMatrix is None:
+        localMatrices = np.linalg.inv(restMatrix) @ poseMatrices
+    else:
+        localMatrices = np.linalg.inv(restMatrix) @ parentRestMatrix @ np.linalg.inv(parentPoseMatrices) @ poseMatrices
+
+    locations = localMatrices[:, 0:3, 3]
+    rotations = localMatrices[:, 0:3, 0:3] / np.linalg.norm(localMatrices[:, 0:3, 0:3], axis=1)[:, None, :]
+    return locations, matricesToQuaternions(rotations)
+
+
+# normalizes (..., F, 4) quaternion tracks and flips the sign of every quaternion whose dot product with the
+# previous frame's is negative, so interpolation between keys never takes the long way round
+def makeQuaternionsContinuous(quaternions):
+    quaternions = quaternions / np.linalg.norm(quaternions, axis=-1, keepdims=True)
+    signs = np.ones(quaternions.shape[:-1])
+    signs[..., 1:] = np.where(np.sum(quaternions[..., 1:, :] * quaternions[..., :-1, :], axis=-1) < 0, -1.0, 1.0)
+    return quaternions * np.cumprod(signs, axis=-1)[..., None]
+
+
+# returns the angle differences a - b wrapped into [-pi, pi)
+def wrapAngles(a, b):
+    return (a - b + np.pi) % (2 * np.pi) - np.pi
+
+
+# converts (..., F, 4) w, x, y, z quaternion tracks into (..., F, 3) XYZ Euler tracks that stay compatible
+# from frame to frame. Every rotation also has the Euler (x + pi, pi - y, z + pi); each frame takes whichever
+# of the two is closer to the previous frame's choice, then every angle is unwrapped to within half a turn of
+# the previous frame's. The two solutions are mirror images, so whether a frame switches solution does not
+# depend on the one the previous frame took, and the choices follow from a running parity of the switches.
+def quaternionsToEulers(quaternions):
+    w, x, y, z = np.moveaxis(quaternions, -1, 0)
+    m00 = 1 - 2 * (y * y + z * z)
+    m10 = 2 * (x * y + w * z)
+    m20 = 2 * (x * z - w * y)
+    m11 = 1 - 2 * (x * x + z * z)
+    m12 = 2 * (y * z - w * x)
+    m21 = 2 * (y * z + w * x)
+    m22 = 1 - 2 * (x * x + y * y)
+    cy = np.hypot(m00, m10)
+
+    # at +-90 degrees pitch x and z turn about the same axis, so z is left at 0 there, as Blender does
+    locked = cy < 16 * np.finfo(np.float32).eps
+    eulers = np.stack((np.where(locked, np.arctan2(-m12, m11), np.arctan2(m21, m22)),
+                       np.arctan2(-m20, cy),
+                       np.where(locked, 0.0, np.arctan2(m10, m00))), axis=-1)
+    flipped = np.where(locked[..., None], eulers, np.stack((np.arctan2(-m21, -m22), np.arctan2(-m20, -cy),
+                                                            np.arctan2(-m10, -m00)), axis=-1))
+
+    stayDistances = np.sum(wrapAngles(eulers[..., 1:, :], eulers[..., :-1, :]) ** 2, axis=-1)
+    switchDistances = np.sum(wrapAngles(flipped[..., 1:, :], eulers[..., :-1, :]) ** 2, axis=-1)
+    switches = np.zeros(eulers.shape[:-1], dtype=np.int64)
+    switches[..., 1:] = switchDistances < stayDistances
+    useFlipped = (np.cumsum(switches, axis=-1) % 2).astype(bool)
+
+    eulers = np.where(useFlipped[..., None], flipped, eulers)
+    return np.unwrap(eulers, axis=-2)
+
+
+# returns the (B, F) frames to key so that linear interpolation between the keys of every one of the B
+# tracks of (B, F, C) values stays within tolerance. Works like Douglas-Peucker for all tracks at once:
+# every pass keys the worst frame of each segment whose error is above the tolerance.
+def reduceKeys(values, tolerance):
+    numTracks, numFrames = values.shape[0:2]
+    keyed = np.zeros((numTracks, numFrames), dtype=bool)
+    if numFrames == 0:
+        return keyed
+    keyed[:, 0] = True
+    keyed[:, -1] = True
+
+    frames = np.arange(numFrames)
+    tracks = np.arange(numTracks)[:, None]
+    while True:
+        previousKeys = np.maximum.accumulate(np.where(keyed, frames, 0), axis=1)
+        nextKeys = np.minimum.accumulate(np.where(keyed, frames, numFrames - 1)[:, ::-1], axis=1)[:, ::-1]
+        weights = ((frames - previousKeys) / np.maximum(nextKeys - previousKeys, 1))[:, :, None]
+        interpolated = values[tracks, previousKeys] * (1 - weights) + values[tracks, nextKeys] * weights
+        errors = np.abs(values - interpolated).max(axis=2)
+        errors[keyed] = 0
+
+        # worst frame of every segment, segments being numbered by their first key
+        segments = (tracks * numFrames + previousKeys).ravel()
+        segmentErrors = np.zeros(numTracks * numFrames)
+        np.maximum.at(segmentErrors, segments, errors.ravel())
+        worst = (errors.ravel() > tolerance) & (errors.ravel() == segmentErrors[segments])
+        if not worst.any():
+            return keyed
+
+        # one new key per segment
+        _, newFrames = np.unique(segments[worst], return_index=True)
+        keyed.ravel()[np.flatnonzero(worst)[newFrames]] = True
+
+
+# adds one F-curve per column of values to the action, keyed at the given frames, writing all keyframe
+# points at once instead of inserting them one by one
+def addBoneCurves(action, boneName, propertyName, frameNumbers, values, linear=False):
+    dataPath = 'pose.bones["%s"].%s' % (boneName, propertyName)
+    points = np.empty((len(frameNumbers), 2), dtype=np.float32)
+    points[:, 0] = frameNumbers
+    for index in range(values.shape[1]):
+        fcurve = action.fcurves.new(dataPath, index=index, action_group=boneName)
+        fcurve.keyframe_points.add(len(frameNumbers))
+        points[:, 1] = values[:, index]
+        fcurve.keyframe_points.foreach_set("co", points.ravel())
+        if linear:
+            fcurve.keyframe_points.foreach_set("interpolation", [LINEAR_INTERPOLATION] * len(frameNumbers))
+        fcurve.update()
+
+
+# returns the armatures to animate: the active and selected ones with the active one first, or else the first
+# armature of the scene. The active armature counts even when unselected, as it is after a cn6 import.
+def getTargetArmatures(context):
+    armatures = [ob for ob in context.selected_objects if ob.type == 'ARMATURE']
+    active = context.view_layer.objects.active
+    if active is not None and active.type == 'ARMATURE':
+        if active in armatures:
+            armatures.remove(active)
+        armatures.insert(0, active)
+    if not armatures:
+        armatures = [ob for ob in context.scene.objects if ob.type == 'ARMATURE'][0:1]
+    return armatures
+
+
+# keys the actions of an armature bone track by bone track, as the na2 file is read. The float32 pose of a
+# parent bone is kept only until all its children in the armature are keyed, and bones read before their
+# parent wait for it as float32 frames. Bones the armature lacks are skipped and reported.
+class ActionBuilder:
+    def __init__(self, armOb, reduce_keys, location_tolerance, rotation_tolerance, rotation_mode):
+        self.armOb = armOb
+        self.rotation_mode = rotation_mode
+        self.reduce_keys = reduce_keys
+        self.location_tolerance = location_tolerance
+        self.rotation_tolerance = rotation_tolerance
+
+        # pose bones and rest matrices by name, looked up once for all framesets
+        self.poseBones = dict((poseBone.name, poseBone) for poseBone in armOb.pose.bones)
+        self.restMatrices = dict((bone.name, np.array(bone.matrix_local, dtype=np.float64)) for bone in armOb.data.bones)
+        self.childCounts = {}
+        for bone in armOb.data.bones:
+            if bone.parent is not None:
+                self.childCounts[bone.parent.name] = self.childCounts.get(bone.parent.name, 0) + 1
+
+        self.actions = []
+        self.missingBones = set()
+        self.keyedBones = set()
+
+    # starts the action of the next frameset, keyed in the file's own frame numbers
+    def beginFrameSet(self, actionName, firstFrame):
+        self.action = bpy.context.blend_data.actions.new(actionName)
+        self.actions.append(self.action)
+        self.firstFrame = firstFrame
+        self.parentPoses = {}
+        self.unkeyedChildren = dict(self.childCounts)
+        self.waiting = {}
+        self.numKeys = 0
+        self.numValues = 0
+
+    # keys a bone from its (F, 4, 4) na2 frame matrices
+    def addBone(self, boneName, frameMatrices):
+        if boneName not in self.poseBones:
+            self.missingBones.add(boneName)
+            return
+        parent = self.poseBones[boneName].parent
+        if parent is not None and parent.name not in self.parentPoses:
+            self.waiting.setdefault(parent.name, []).append((boneName, frameMatrices))
+        else:
+            self.keyBone(boneName, frameMatrices, None if parent is None else self.parentPoses[parent.name])
+
+    def keyBone(self, boneName, frameMatrices, parentPoseMatrices):
+        poseMatrices = getPoseMatrices(frameMatrices)
+        if parentPoseMatrices is None:
+            locations, quaternions = getLocalTransforms(self.restMatrices[boneName], poseMatrices)
+        else:
+            parentName = self.poseBones[boneName].parent.name
+            locations, quaternions = getLocalTransforms(self.restMatrices[boneName], poseMatrices,
+                                                        self.restMatrices[parentName],
+                                                        np.asarray(parentPoseMatrices, dtype=np.float64))
+
+            # the parent's pose is dropped once its last child is keyed
+            self.unkeyedChildren[parentName] -= 1
+            if self.unkeyedChildren[parentName] == 0:
+                self.parentPoses.pop(parentName, None)
+
+        quaternions = makeQuaternionsContinuous(quaternions)
+        if self.rotation_mode == 'QUATERNION':
+            rotationProperty, rotations = "rotation_quaternion", quaternions
+        else:
+            rotationProperty, rotations = "rotation_euler", quaternionsToEulers(quaternions)
+
+        if self.reduce_keys:
+            # keys that linear interpolation between the remaining keys reproduces within tolerance are dropped
+            locationFrames = np.flatnonzero(reduceKeys(locations[None], self.location_tolerance)[0])
+            rotationFrames = np.flatnonzero(reduceKeys(rotations[None], self.rotation_tolerance)[0])
+        else:
+            # frames that repeat the previous frame's matrix are not keyed
+            keyed = np.ones(len(frameMatrices), dtype=bool)
+            keyed[1:] = np.any(frameMatrices[1:] != frameMatrices[:-1], axis=(1, 2))
+            locationFrames = rotationFrames = np.flatnonzero(keyed)
+
+        addBoneCurves(self.action, boneName, "location", self.firstFrame + locationFrames,
+                      locations[locationFrames], self.reduce_keys)
+        addBoneCurves(self.action, boneName, rotationProperty, self.firstFrame + rotationFrames,
+                      rotations[rotationFrames], self.reduce_keys)
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug("%s: %d location and %d rotation keys", boneName, len(locationFrames), len(rotationFrames))
+        self.numKeys += 3 * len(locationFrames) + rotations.shape[1] * len(rotationFrames)
+        self.numValues += (3 + rotations.shape[1]) * len(frameMatrices)
+        self.keyedBones.add(boneName)
+
+        # the pose matrices are copies of the float32 file values, so float32 keeps them exactly
+        if self.unkeyedChildren.get(boneName, 0) > 0:
+            self.parentPoses[boneName] = poseMatrices.astype(np.float32)
+        for childName, childFrameMatrices in self.waiting.pop(boneName, []):
+            self.keyBone(childName, childFrameMatrices, poseMatrices)
+
+    # keys the bones whose parent is not in the frameset, the parent keeping its current pose, and returns
+    # the number of keys of the frameset and the number there would be without skipping
+    def endFrameSet(self):
+        while self.waiting:
+            waitingBones = set(child[0] for children in self.waiting.values() for child in children)
+            parentName = next(name for name in self.waiting if name not in waitingBones)
+            parentPoseMatrices = np.array(self.poseBones[parentName].matrix, dtype=np.float64)
+            for childName, childFrameMatrices in self.waiting.pop(parentName):
+                self.keyBone(childName, childFrameMatrices, parentPoseMatrices)
+        self.parentPoses = {}
+        return self.numKeys, self.numValues
+
+    def reportMissingBones(self):
+        if self.missingBones:
+            log.warning("%s lacks %d animated bones, skipped: %s", self.armOb.name, len(self.missingBones),
+                        ", ".join(sorted(self.missingBones)))
+
+
+# puts the actions in strips one after the other from startFrame on a track named after the file, and
+# returns the last frame of the strips
+def addActionStrips(armOb, clipName, frameSetInfos, actions, startFrame, sceneFps):
+    if armOb.animation_data is None:
+        armOb.animation_data_create()
+    track = armOb.animation_data.nla_tracks.new()
+    track.name = clipName
+
+    stripStart = startFrame
+    for (firstFrame, lastFrame, fps), action in zip(frameSetInfos, actions):
+        # strips can't be empty, so a single frame clip still plays for one frame
+        strip = track.strips.new(action.name, stripStart, action)
+        strip.action_frame_start = firstFrame
+        strip.action_frame_end = max(lastFrame, firstFrame + 1)
+        if fps != sceneFps:
+            strip.scale = sceneFps / fps
+        stripStart = int(strip.frame_end) + 1
+
+    # the strips play through the NLA rather than as the active action
+    armOb.animation_data.action = None
+    return stripStart - 1
+
+
+# identical copy of PhaseProfile in Blender-2.8-Addons/io_import_cn6.py, change all copies together
+class PhaseProfile:
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.phases = []
+        self.current = None
+        self.startTime = time.perf_counter()
+        self.ownsTracemalloc = enabled and not tracemalloc.is_tracing()
+        if self.ownsTracemalloc:
+            tracemalloc.start()
+
+    # ends the current phase and starts the named one
+    def begin(self, name, **counts):
+        if not self.enabled:
+            return
+        self.end()
+        if hasattr(tracemalloc, 'reset_peak'):
+            tracemalloc.reset_peak()
+        self.current = {'name': name, 'start': time.perf_counter(), 'counts': {}}
+        self.count(**counts)
+
+    # adds to the counts (verts, loops, bones, keys...) of the current phase
+    def count(self, **counts):
+        if self.current is None:
+            return
+        phaseCounts = self.current['counts']
+        for key, value in counts.items():
+            phaseCounts[key] = phaseCounts.get(key, 0) + int(value)
+
+    def end(self):
+        if self.current is None:
+            return
+        phase = self.current
+        phase['seconds'] = time.perf_counter() - phase['start']
+        phase['start'] = phase['start'] - self.startTime
+        phase['peakBytes'] = tracemalloc.get_traced_memory()[1] if tracemalloc.is_tracing() else None
+        self.phases.append(phase)
+        self.current = None
+
+    # ends profiling and writes <path>.profile.json, and <path>.trace.json with chromeTrace
+    def write(self, path, chromeTrace=False):
+        if not self.enabled:
+            return
+        self.end()
+        totalSeconds = time.perf_counter() - self.startTime
+        if self.ownsTracemalloc:
+            tracemalloc.stop()
+            self.ownsTracemalloc = False
+
+        # repeated phases, such as one per mesh, are summed up
+        totals = {}
+        for phase in self.phases:
+            total = totals.setdefault(phase['name'], {'calls': 0, 'seconds': 0.0, 'peakBytes': None, 'counts': {}})
+            total['calls'] += 1
+            total['seconds'] += phase['seconds']
+            if phase['peakBytes'] is not None:
+                total['peakBytes'] = max(total['peakBytes'] or 0, phase['peakBytes'])
+            for key, value in phase['counts'].items():
+                total['counts'][key] = total['counts'].get(key, 0) + value
+
+        report = {'file': path, 'seconds': totalSeconds, 'phases': totals, 'timeline': self.phases}
+        with open(path + '.profile.json', 'w') as file:
+            json.dump(report, file, indent=1)
+        log.info("Profile written to %s.profile.json", path)
+
+        if chromeTrace:
+            events = []
+            for phase in self.phases:
+                args = dict(phase['counts'])
+                args['peakBytes'] = phase['peakBytes']
+                events.append({'name': phase['name'], 'ph': 'X', 'pid': os.getpid(), 'tid': 0,
+                    'ts': phase['start'] * 1e6, 'dur': phase['seconds'] * 1e6, 'args': args})
+            with open(path + '.trace.json', 'w') as file:
+                json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, file)
+            log.info("Chrome trace written to %s.trace.json", path)
+
+
+def import_na2(path, verbosity='SUMMARY', profile=False, chrome_trace=False, reduce_keys=False, location_tolerance=0.001,
+               rotation_tolerance=0.0005, rotation_mode='QUATERNION'):
+    setVerbosity(verbosity)
+    log.info("START NA2 IMPORT: %s", path)
+
+    phase_profile = PhaseProfile(profile)
+    try:
+        return importNA2(path, phase_profile, reduce_keys, location_tolerance, rotation_tolerance, rotation_mode)
+    finally:
+        phase_profile.write(path, chrome_trace)
+
 
+def importNA2(path, profile, reduce_keys, location_tolerance, rotation_tolerance, rotation_mode):
     # get scene
     scene = bpy.context.scene
     if scene == None:
@@ -94,6 +520,24 @@ def import_na2(path):
     except ValueError:
         return "FrameSets is invalid!"
 
+    armatures = getTargetArmatures(bpy.context)
+    if not armatures:
+        return "No armature to import to!"
+
+    bpy.context.view_layer.objects.active = armatures[0]
+    bpy.ops.object.mode_set(mode='POSE')
+
+    # armatures sharing their armature data share the actions too
+    builders = {}
+    for armOb in armatures:
+        if armOb.data.name not in builders:
+            builders[armOb.data.name] = ActionBuilder(armOb, reduce_keys, location_tolerance, rotation_tolerance,
+                                                      rotation_mode)
+
+    # the file is bone-major, so every bone track is keyed as soon as it is read and then dropped. Besides the
+    # track being read, only the poses of parents with children still to come are held.
+    clipName = os.path.splitext(os.path.basename(path))[0]
+    frameSetInfos = []
     for y in range(frameSets):
         try:
             lines = getNextLine(file).split()
@@ -135,102 +579,71 @@ def import_na2(path):
         except ValueError:
             return "numBones is invalid!"
 
-        boneNames = []
-        boneFrameSets = []
+        profile.begin("frameset", bones=numBones, frames=numFrames)
+        time_before = datetime.now()
+
+        log.info("Number of bones: %d", numBones)
+        log.info("Number of frames: %d", numFrames)
 
-        print("Number of bones: %d" % numBones)
-        print("Number of frames: %d" % numFrames)
+        # The scene takes the first frameset's FPS, the strips of framesets with another FPS are scaled to match
+        if y == 0:
+            scene.render.fps = fps
+        frameSetInfos.append((firstFrame, lastFrame, fps))
+        for builder in builders.values():
+            builder.beginFrameSet("%s_%d" % (clipName, y), firstFrame)
 
         for i in range(numBones):
             try:
                 boneName = file.readline().strip()
-                boneNames.append(boneName)
             except ValueError:
                 return "bone name is invalid!"
 
-            frames = []
-
-            for j in range(numFrames):
-                try:
-                    lines = getNextLine(file).split()
-                    if len(lines) != 16:
-                        raise ValueError
-                    frames.append( \
-                        [ \
-                            [float(lines[0]), float(lines[1]), float(lines[2]), float(lines[3])], \
-                            [float(lines[4]), float(lines[5]), float(lines[6]), float(lines[7])], \
-                            [float(lines[8]), float(lines[9]), float(lines[10]), float(lines[11])], \
-                            [float(lines[12]), float(lines[13]), float(lines[14]), float(lines[15])] \
-                            ] \
-                        )
-                except ValueError:
-                    return "bone frame matrix invalid!"
-
-            boneFrameSets.append(frames)
-
-        time_before = datetime.now()
-
-        scene.render.fps = fps
-        currentFrame = scene.frame_current
-        scene.frame_start = 1
-        scene.frame_end = currentFrame + lastFrame
-
-        allObjects = scene.objects
-        armOb = allObjects[0]
-
-        bpy.context.view_layer.objects.active = armOb
-        bpy.ops.object.mode_set(mode='POSE')
-
-        blender_action = bpy.context.blend_data.actions.new("Action")
-        if armOb.animation_data is None:
-            armOb.animation_data_create()
-        armOb.animation_data.action = blender_action
-
-        prev_bone_matrix = {}
-        prev_matrix = None
-
-        for y in range(numFrames):
-
-            skipped_bones = 0
-            frame_time_before = datetime.now()
-
-            for z in range(1, numBones):
-                boneName = boneNames[z]
-                x = boneFrameSets[z][y]
-                poseBone = armOb.pose.bones[boneName]
-                if poseBone != None:
-
-                    animMatrix = Matrix([[x[2][0], x[0][0], x[1][0], x[3][0]],
-                                         [x[2][1], x[0][1], x[1][1], x[3][1]],
-                                         [x[2][2], x[0][2], x[1][2], x[3][2]],
-                                         [0, 0, 0, 1]])
-
-                    if boneName in prev_bone_matrix:
-                        prev_matrix = prev_bone_matrix[boneName]
-
-                    prev_bone_matrix[boneName] = animMatrix
-
-                    if prev_matrix and prev_matrix == animMatrix:
-                        skipped_bones += 1
-                        continue
-                    else:
-                        poseBone.matrix = animMatrix
-                        bpy.context.view_layer.update()
-
-                        poseBone.keyframe_insert(data_path="location", frame=currentFrame + y)
-                        poseBone.keyframe_insert(data_path="rotation_quaternion", frame=currentFrame + y)
-
-            frame_time_after = datetime.now()
-            frame_diff = frame_time_after - frame_time_before
-            frame_diff = frame_diff / timedelta(microseconds=1)
-            print("Frame", str(y + 1), "/", numFrames, "loaded.", "Skipped bones:", skipped_bones, "; Took",
-                  str(frame_diff), "microseconds.")
+            # the bone's frame lines are converted to floats in one go
+            try:
+                frameText = ' '.join([getNextLine(file) for j in range(numFrames)])
+                frameMatrices = np.fromstring(frameText, dtype=np.float32, sep=' ')
+                if frameMatrices.size != numFrames * 16:
+                    raise ValueError
+                frameMatrices = frameMatrices.reshape(numFrames, 4, 4)
+            except ValueError:
+                return "bone frame matrix invalid!"
+            del frameText
+
+            # bone 0 is the world bone which the cn6 import removes
+            if i > 0:
+                for builder in builders.values():
+                    builder.addBone(boneName, frameMatrices)
+
+        numKeys = numValues = 0
+        for builder in builders.values():
+            builderKeys, builderValues = builder.endFrameSet()
+            numKeys += builderKeys
+            numValues += builderValues
+        profile.count(keys=numKeys)
+        if numValues:
+            log.info("%d of %d keys kept (%.1f%%)", numKeys, numValues, 100.0 * numKeys / numValues)
 
         time_after = datetime.now()
         diff = time_after - time_before
-        print("Setting pose matrices done. Took ", str(diff.seconds), "seconds.")
-
-    print("End.")
+        log.info("Frameset %s_%d: frames %d to %d at %d FPS. Took %s seconds.", clipName, y, firstFrame, lastFrame,
+                 fps, diff.total_seconds())
+
+    frameEnd = scene.frame_current
+    for armOb in armatures:
+        builder = builders[armOb.data.name]
+        frameEnd = addActionStrips(armOb, clipName, frameSetInfos, builder.actions, scene.frame_current,
+                                   scene.render.fps)
+        for poseBone in armOb.pose.bones:
+            if poseBone.name in builder.keyedBones:
+                poseBone.rotation_mode = rotation_mode
+        log.info("Animated %s", armOb.name)
+    for builder in builders.values():
+        builder.reportMissingBones()
+
+    scene.frame_start = 1
+    scene.frame_end = frameEnd
+
+    log.info("End.")
 
     return ""
 
@@ -241,13 +654,31 @@ class Import_na2(bpy.types.Operator, ImportHelper):
     bl_label = "Import NA2 (.na2)"
     bl_description = "Import a Civilization Animation .na2 file"
     filename_ext = ".na2"
-    filter_glob = StringProperty(default="*.na2", options={'HIDDEN'})
-
-    filepath = StringProperty(name="File Path", description="Filepath used for importing the file", maxlen=1024,
-                              subtype='FILE_PATH')
+    filter_glob: StringProperty(default="*.na2", options={'HIDDEN'})
+
+    filepath: StringProperty(name="File Path", description="Filepath used for importing the file", maxlen=1024,
+                             subtype='FILE_PATH')
+    verbosity: EnumProperty(name="Verbosity", description="Amount of console output", items=VERBOSITY_ITEMS,
+                            default='SUMMARY')
+    profile: BoolProperty(name="Write Profile", default=False,
+                          description="Write the time, memory peak and counts of each import phase to a "
+                                      ".profile.json file next to the .na2")
+    chrome_trace: BoolProperty(name="Write Chrome Trace", default=False,
+                               description="With Write Profile, also write a .trace.json file for chrome://tracing")
+    reduce_keys: BoolProperty(name="Reduce Keys", default=False,
+                              description="Drop keys that linear interpolation between the remaining keys reproduces "
+                                          "within the tolerances, and make the keys linear")
+    location_tolerance: FloatProperty(name="Location Tolerance", default=0.001, min=0.0, precision=4,
+                                      description="Largest location error allowed when reducing keys")
+    rotation_tolerance: FloatProperty(name="Rotation Tolerance", default=0.0005, min=0.0, precision=5,
+                                      description="Largest quaternion component or Euler angle error allowed when "
+                                                  "reducing keys")
+    rotation_mode: EnumProperty(name="Rotation", description="Rotation channels to key", items=ROTATION_MODE_ITEMS,
+                                default='QUATERNION')
 
     def execute(self, context):
-        import_na2(self.filepath)
+        import_na2(self.filepath, self.verbosity, self.profile, self.chrome_trace, self.reduce_keys,
+                   self.location_tolerance, self.rotation_tolerance, self.rotation_mode)
         return {'FINISHED'}
 
     def invoke(self, context, event):